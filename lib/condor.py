@@ -14,18 +14,35 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """ condor related routines """
+import concurrent.futures
+import functools
 import os
 import sys
 import glob
+import queue
 import re
 import random
 import subprocess
-from typing import Dict, List, Any, Tuple, Optional, Union
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Any,
+    Set,
+    Tuple,
+    Optional,
+    Union,
+)
 
 import htcondor  # type: ignore
 import classad  # type: ignore
 
 import packages
+import schedd_cache
 
 random.seed()
 
@@ -33,105 +50,357 @@ random.seed()
 COLLECTOR_HOST = htcondor.param.get("COLLECTOR_HOST", None)
 
 
-# pylint: disable-next=no-member
-def get_schedd(vargs: Dict[str, Any]) -> classad.ClassAd:
-    """get jobsub* schedd names from collector, pick one."""
+# schedd attributes jobsub needs from the collector, to talk to a schedd
+# and to pick one
+SCHEDD_PROJECTION = [
+    "Name",
+    "Machine",
+    "MyAddress",
+    "AddressV1",
+    "CondorVersion",
+    "IsJobsubLite",
+    "SupportedVOList",
+    "InDownTime",
+    "TotalIdleJobs",
+    "TotalRunningJobs",
+    "RecentDaemonCoreDutyCycle",
+    "NumUsers",
+]
+
+# how much each published schedd attribute counts towards its load;
+# a duty cycle near 1.0 means the schedd is saturated no matter how few
+# jobs it has, so it counts like ten thousand jobs.
+SCHEDD_LOAD_WEIGHTS: Dict[str, float] = {
+    "TotalIdleJobs": 1.0,
+    "TotalRunningJobs": 1.0,
+    "RecentDaemonCoreDutyCycle": 10000.0,
+    "NumUsers": 100.0,
+}
+
+# submit with the python bindings rather than running condor_submit; off
+# unless JOBSUB_NATIVE_SUBMIT is set (to anything but 0), for single and
+# --batch-file submissions alike
+NATIVE_SUBMIT = os.getenv("JOBSUB_NATIVE_SUBMIT", "") not in ("", "0")
+
+# do plain jobsub_q listings with the python bindings rather than condor_q
+NATIVE_Q = os.getenv("JOBSUB_NATIVE_Q", "1") not in ("", "0")
+
+# do jobsub_rm/hold/release with Schedd.act rather than condor_rm etc.
+NATIVE_ACT = os.getenv("JOBSUB_NATIVE_ACT", "1") not in ("", "0")
+
+# do --maxConcurrent as one late materialized cluster, rather than a DAG,
+# on schedds at least LATE_MATERIALIZE_VERSION
+LATE_MATERIALIZE = os.getenv("JOBSUB_LATE_MATERIALIZE", "1") not in ("", "0")
+LATE_MATERIALIZE_VERSION = (9, 0, 0)
+
+# default policy for picking a schedd, see SCHEDD_SELECTORS
+SCHEDD_SELECTION = os.getenv("JOBSUB_SCHEDD_SELECTION", "random")
+
+
+def schedd_constraint(vargs: Dict[str, Any]) -> str:
+    """collector constraint picking the jobsub* schedds serving our group"""
+    # pick schedds who do or do not have "dev" in their name, depending if
+    # we have "devserver" set...
+    dev = "true" if vargs.get("devserver", "") else "false"
+    # SupportedVOList is a substring check, as it always has been
+    vo = classad.quote(re.escape(vargs["group"]))
+    return (
+        # Pick the jobsub_lite schedds in the pool
+        "IsJobsubLite =?= true"
+        f' && regexp("dev", Machine) =?= {dev}'
+        # Only get schedds whose SupportedVOLists include our VO (group)
+        f" && regexp({vo}, SupportedVOList) =?= true"
+        # Make sure we don't pick any schedds in downtime
+        " && InDownTime =!= true"
+    )
+
+
+def _query_schedds(vargs: Dict[str, Any]) -> List[classad.ClassAd]:
+    """get classads for the jobsub* schedds serving our group from collector"""
     # pylint: disable-next=no-member
     coll = htcondor.Collector(COLLECTOR_HOST)
-    # pylint: disable-next=no-member
-    schedd_classads = coll.locateAll(htcondor.DaemonTypes.Schedd)
+    constraint = schedd_constraint(vargs)
+    if vargs.get("verbose", 0) > 1:
+        print(f"schedd constraint: {constraint}")
 
-    # locateAll gives a list of minimal classads... but
-    # need to directQuery for the full classads to check for
-    # SupportedVOList...
+    # one round trip, filtered on the collector, and only the attributes
+    # we use come back
+    # pylint: disable-next=no-member
+    schedd_classads = coll.query(
+        htcondor.AdTypes.Schedd, constraint=constraint, projection=SCHEDD_PROJECTION
+    )
 
     if vargs.get("verbose", 0) > 1:
         print(f"schedd classads: {schedd_classads} ")
 
-    # pick schedds who do or do not have "dev" in their name, depending if
-    # we have "devserver" set...
+    return list(schedd_classads)
 
-    if vargs.get("devserver", ""):
-        schedd_classads = [
-            ca for ca in schedd_classads if ca.eval("Machine").find("dev") != -1
-        ]
-    else:
-        schedd_classads = [
-            ca for ca in schedd_classads if ca.eval("Machine").find("dev") == -1
-        ]
-
-    # print("after dev check:" , [ca.eval("Machine") for ca in schedds])
-
-    full_schedd_classads = []
-    for ca in schedd_classads:
-        full_schedd_classads.append(
-            # pylint: disable-next=no-member
-            coll.directQuery(htcondor.DaemonTypes.Schedd, name=ca.eval("Machine"))
-        )
 
-    # Filters to pick our schedds
-    schedds = [
-        schedd_classad
-        for schedd_classad in full_schedd_classads
-        # Pick the jobsub_lite schedds in the pool
-        if (
-            ("IsJobsubLite" in schedd_classad)
-            and (schedd_classad.eval("IsJobsubLite") == True)
-        )
-        # Only get schedds whose SupportedVOLists include our VO (group)
-        and (
-            (
-                ("SupportedVOList" in schedd_classad)
-                and (schedd_classad.eval("SupportedVOList").find(vargs["group"]) != -1)
-            )
+def get_schedd_list(vargs: Dict[str, Any]) -> List[classad.ClassAd]:
+    """
+    get jobsub* schedd classads we could submit to, from the schedd
+    cache if possible, otherwise from the collector.
+    """
+    key = schedd_cache.cache_key(COLLECTOR_HOST, vargs)
+    verbose = vargs.get("verbose", 0)
+    schedd_classads, stale = schedd_cache.lookup(key)
+    if schedd_classads is None:
+        schedd_classads = _query_schedds(vargs)
+        schedd_cache.store(key, schedd_classads, verbose)
+    elif stale:
+        schedd_cache.refresh_in_background(key, lambda: _query_schedds(vargs), verbose)
+    elif verbose > 1:
+        print("using cached schedd classads")
+    return schedd_classads
+
+
+def schedd_load(schedd_classad: classad.ClassAd) -> float:
+    """weighted sum of the load attributes a schedd publishes"""
+    load = 0.0
+    for attr, weight in SCHEDD_LOAD_WEIGHTS.items():
+        try:
+            load += weight * float(schedd_classad.eval(attr))
+        except (KeyError, TypeError, ValueError):
+            # not published (or undefined), doesn't count
+            pass
+    return load
+
+
+def select_random(schedds: List[classad.ClassAd]) -> classad.ClassAd:
+    """every schedd equally likely"""
+    return random.choice(schedds)
+
+
+def select_weighted(schedds: List[classad.ClassAd]) -> classad.ClassAd:
+    """schedds picked with probability inversely proportional to their load"""
+    weights = [1.0 / (1.0 + schedd_load(ca)) for ca in schedds]
+    return random.choices(schedds, weights=weights)[0]
+
+
+def select_power_of_two(schedds: List[classad.ClassAd]) -> classad.ClassAd:
+    """pick two schedds at random, take the less loaded one"""
+    if len(schedds) < 2:
+        return random.choice(schedds)
+    return min(random.sample(schedds, 2), key=schedd_load)
+
+
+# schedd selection policies by name; add to this (and to
+# utils.SCHEDD_SELECTION_POLICIES) to plug in another one
+SCHEDD_SELECTORS: Dict[str, Callable[[List[classad.ClassAd]], classad.ClassAd]] = {
+    "random": select_random,
+    "weighted": select_weighted,
+    "p2c": select_power_of_two,
+}
+
+
+# pylint: disable-next=no-member
+def get_schedd(vargs: Dict[str, Any]) -> classad.ClassAd:
+    """
+    get jobsub* schedd names from collector, pick one with the policy
+    named by vargs["schedd_selection"] (jobsub_submit --schedd-selection)
+    or $JOBSUB_SCHEDD_SELECTION.
+    """
+    return get_schedds(vargs, 1)[0]
+
+
+def get_schedds(vargs: Dict[str, Any], count: int) -> List[classad.ClassAd]:
+    """
+    like get_schedd, but pick count different schedds (or as many as
+    there are), i.e. for jobsub_submit --spread-schedds
+    """
+    schedds = get_schedd_list(vargs)
+    if not schedds:
+        raise Exception(
+            f'no eligible schedds for group "{vargs.get("group", "")}"'
+            f" in HTCondor pool {COLLECTOR_HOST}"
         )
-        # Make sure we don't pick any schedds in downtime
-        and (
-            ("InDownTime" not in schedd_classad)
-            or (
-                ("InDownTime" in schedd_classad)
-                and (schedd_classad.eval("InDownTime") != True)
-            )
+    policy = vargs.get("schedd_selection", None) or SCHEDD_SELECTION
+    if policy not in SCHEDD_SELECTORS:
+        where = "" if vargs.get("schedd_selection") else " in $JOBSUB_SCHEDD_SELECTION"
+        raise ValueError(
+            f"unknown schedd selection policy {policy}{where}, "
+            f"expected one of {list(SCHEDD_SELECTORS)}"
         )
-    ]
+    picked: List[classad.ClassAd] = []
+    while schedds and len(picked) < count:
+        res = SCHEDD_SELECTORS[policy](schedds)
+        if vargs.get("verbose", 0) > 1:
+            print(f"picked schedd {res.get('Name')} with policy {policy}")
+        picked.append(res)
+        schedds = [ca for ca in schedds if ca is not res]
+    return picked
 
-    res = random.choice(schedds)
-    return res
 
+def supports_late_materialize(schedd_classad: classad.ClassAd) -> bool:
+    """
+    can we give this schedd a max_materialize submission; go by the
+    CondorVersion in its classad, as late materialization is on by
+    default from 9.0 on.
+    """
+    if not LATE_MATERIALIZE:
+        return False
+    m = re.search(
+        r"\$CondorVersion:\s*(\d+)\.(\d+)\.(\d+)",
+        str(schedd_classad.get("CondorVersion", "")),
+    )
+    if not m:
+        return False
+    return tuple(int(x) for x in m.groups()) >= LATE_MATERIALIZE_VERSION
 
-def load_submit_file(filename: str) -> Tuple[Any, Optional[int]]:
-    """pull in a condor submit file, make a dictionary"""
 
-    #
-    # NOTICE: this needs extra bits as added by condor
-    #   if you run condor_submit --dump filename
-    #   until that's done, we have to call real condor_submit.
-    #
+def load_submit_file(
+    filename: str, macros: Optional[Dict[str, str]] = None
+) -> Tuple[Any, int, bool]:
+    """
+    pull in a condor submit file as an htcondor.Submit object, with the
+    given submit macros set, along with its queue count (per item, if
+    there is item data), and whether its queue statement has item data.
+    """
     with open(filename, "r", encoding="UTF-8") as f:
-        res = {}
-        nqueue = None
-        for line in f:
-            line = line.strip()
-            if line.startswith("#"):
-                continue
-            t = re.split(r"\s*=\s*", line, maxsplit=1)
-            if len(t) == 2:
-                res[t[0]] = t[1]
-            elif line.startswith("queue"):
-                nqueue = int(line[5:])
-            elif not line:
-                pass  # blank lines ok
-            else:
-                raise SyntaxError(f"malformed line: {line}")
+        # pylint: disable-next=no-member
+        subm = htcondor.Submit(f.read())
+    for k, v in (macros or {}).items():
+        subm[k] = v
+    qargs = subm.getQArgs().strip()
+    # the count may be a macro, i.e. queue $(JOBSUB_N) for --spread-schedds
+    m = re.match(r"(\d+|\$\((\w+)\))?\s*(.*)", qargs, re.DOTALL)
+    count = 1
+    if m and m.group(2):
+        count = int(subm.get(m.group(2), "1"))
+    elif m and m.group(1):
+        count = int(m.group(1))
+    return subm, count, bool(m and m.group(3))
+
+
+@functools.lru_cache(maxsize=None)
+def locate_schedd(schedd_name: str) -> classad.ClassAd:
+    """
+    locate the named schedd in the pool; remembered for the life of
+    the process, so we ask the collector once per schedd
+    """
+    # pylint: disable-next=no-member
+    c = htcondor.Collector(COLLECTOR_HOST)
+    # pylint: disable-next=no-member
+    s = c.locate(htcondor.DaemonTypes.Schedd, schedd_name)
+    if s is None:
+        raise Exception(f'unable to find schedd "{schedd_name}" in HTCondor pool')
+    return s
+
+
+def get_schedd_handle(schedd_name: str) -> htcondor.Schedd:
+    """locate the named schedd in the pool, return a Schedd object for it"""
+    # pylint: disable-next=no-member
+    return htcondor.Schedd(locate_schedd(schedd_name))
+
+
+def bearer_token_file(vargs: Dict[str, Any]) -> str:
+    """
+    the token file to hand condor tools; packages.orig_env() drops it from
+    our environment after the first submission, so prefer the one in vargs
+    """
+    return str(vargs.get("token", None) or os.environ["BEARER_TOKEN_FILE"])
+
+
+def store_oauth_creds(subm: Any, vargs: Dict[str, Any], schedd_name: str) -> bool:
+    """
+    do what condor_submit does for use_oauth_services: run the configured
+    SEC_CREDENTIAL_STORER (i.e. condor_vault_storer) for the services the
+    job needs, talking to the credd on our schedd.
+    """
+    services = []
+    for req in subm.oauth_services():
+        service = req["Service"]
+        if req.get("Handle", ""):
+            service = f"{service}*{req['Handle']}"
+        services.append(service)
     # pylint: disable-next=no-member
-    return htcondor.Submit(res), nqueue
+    storer = htcondor.param.get("SEC_CREDENTIAL_STORER", None)
+    if not services or not storer:
+        return True
+
+    # like condor_submit gets from submit(), our original environment plus
+    # the token, without touching os.environ, which other threads may be using
+    env = dict(packages.SAVED_ENV or os.environ)
+    env["BEARER_TOKEN_FILE"] = bearer_token_file(vargs)
+    env["_condor_CREDD_HOST"] = schedd_name
+    if vargs.get("verbose", 0) > 0:
+        print(f"Running: {storer} {' '.join(services)}")
+    output = subprocess.run([storer] + services, env=env, check=False)
+    if output.returncode != 0:
+        sys.stderr.write(
+            f"Error: {storer} exited with failed status code {output.returncode}\n"
+        )
+        return False
+    return True
+
+
+def submit_native(
+    f: str,
+    vargs: Dict[str, Any],
+    schedd_name: str,
+    schedd: Any = None,
+    macros: Optional[Dict[str, str]] = None,
+) -> Optional[int]:
+    """
+    submit the job in-process with the condor python bindings, spooling
+    input files like condor_submit -remote does.  A caller submitting many
+    jobs can pass in a Schedd object to reuse its connection.
+    Returns the cluster id, or None on failure.
+    """
+    subm, count, has_items = load_submit_file(f, macros)
+    # paths in the submit file are relative to its directory, whatever our
+    # current directory is
+    if "initialdir" not in subm.keys():
+        subm["initialdir"] = os.path.dirname(os.path.abspath(f))
+    # with --queue-from etc. we get count jobs for each item
+    items = list(subm.itemdata()) if has_items else None
+
+    if not store_oauth_creds(subm, vargs, schedd_name):
+        return None
+
+    try:
+        if schedd is None:
+            schedd = get_schedd_handle(schedd_name)
+        print("Submitting job(s)", flush=True)
+        result = schedd.submit(subm, count=count, spool=True, itemdata=items)
+        cluster = result.cluster()
+        schedd.spool(
+            list(
+                subm.jobs(
+                    count=count,
+                    itemdata=None if items is None else iter(items),
+                    clusterid=cluster,
+                )
+            )
+        )
+    # pylint: disable-next=broad-except
+    except Exception as e:
+        sys.stderr.write(f"Error: submission to {schedd_name} failed: {e}\n")
+        # don't hand this schedd to the next submission from the cache
+        schedd_cache.invalidate(schedd_name)
+        return None
+
+    print(f"{result.num_procs()} job(s) submitted to cluster {cluster}.")
+    print(f"Use job id {cluster}.0@{schedd_name} to retrieve output")
+    return int(cluster)
 
 
 # pylint: disable-next=dangerous-default-value
 def submit(
-    f: str, vargs: Dict[str, Any], schedd_name: str, cmd_args: List[str] = []
+    f: str,
+    vargs: Dict[str, Any],
+    schedd_name: str,
+    cmd_args: List[str] = [],
+    schedd: Any = None,
+    macros: Optional[Dict[str, str]] = None,
 ) -> Union[Any, bool]:
-    """Actually submit the job, using condor python bindings"""
+    """
+    Actually submit the job, with condor_submit, or in-process using the
+    condor python bindings if vargs["native_submit"] or $JOBSUB_NATIVE_SUBMIT
+    is set.  macros are extra submit macros, as in condor_submit name=value.
+    Returns the cluster id if we know it, True if it worked but we
+    don't, and False/None if we didn't submit.
+    """
 
     schedd_args = f"-remote {schedd_name}"
 
@@ -148,20 +417,28 @@ def submit(
     if vargs.get("verbose", 0) > 1:
         print(f"cmd_args: {cmd_args}")
 
-    # commenting this out for now since the 'else' is not implemented
-    #    if True:
+    # the bindings can't take arbitrary condor_submit command line args
+    if f and not cmd_args and vargs.get("native_submit", NATIVE_SUBMIT):
+        return submit_native(f, vargs, schedd_name, schedd, macros)
 
-    qargs = " ".join([f"'{x}'" for x in cmd_args])
+    macro_args = [f"{k}={v}" for k, v in (macros or {}).items()]
+    qargs = " ".join([f"'{x}'" for x in cmd_args + macro_args])
     cmd = f"/usr/bin/condor_submit -pool {COLLECTOR_HOST} {schedd_args} {qargs}"
-    cmd = f"BEARER_TOKEN_FILE={os.environ['BEARER_TOKEN_FILE']} {cmd}"
+    cmd = f"BEARER_TOKEN_FILE={bearer_token_file(vargs)} {cmd}"
     cmd = f"_condor_CREDD_HOST={schedd_name} {cmd}"
     packages.orig_env()
     if vargs.get("verbose", 0) > 0:
         print(f"Running: {cmd}")
 
     try:
+        # relative paths in the submit file are relative to its directory
         output = subprocess.run(
-            cmd, shell=True, stdout=subprocess.PIPE, encoding="UTF-8", check=False
+            cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            encoding="UTF-8",
+            check=False,
+            cwd=os.path.dirname(f) if os.path.isabs(f) else None,
         )
         sys.stdout.write(output.stdout)
 
@@ -175,24 +452,29 @@ def submit(
             sys.stderr.write(
                 f"Error: condor_submit exited with failed status code {output.returncode}\n"
             )
+            # don't hand this schedd to the next submission from the cache
+            schedd_cache.invalidate(schedd_name)
             return None
 
         m = re.search(r"\d+ job\(s\) submitted to cluster (\d+).", output.stdout)
         if m:
             print(f"Use job id {m.group(1)}.0@{schedd_name} to retrieve output")
+            return int(m.group(1))
 
         return True
     except OSError as e:
         print("Execution failed: ", e)
         return None
 
-    # This 'else' is not currently implemented
-    #    else:
-    #        subm, nqueue = load_submit_file(f)
-    #        with schedd.transaction() as txn:
-    #            cluster = subm.queue(txn, count=nqueue)
-    #        print(f"jobid: {cluster}@{schedd_name}")
-    #        return True
+
+@functools.lru_cache(maxsize=None)
+def get_csd_version() -> str:
+    """
+    our condor version, as condor_submit_dag passes it to condor_dagman
+    with -CsdVersion, for the templated .condor.sub files
+    """
+    # pylint: disable-next=no-member
+    return str(htcondor.version()).replace(" ", "' '")
 
 
 # pylint: disable-next=dangerous-default-value
@@ -200,10 +482,10 @@ def submit_dag(
     f: str, vargs: Dict[str, Any], schedd_name: str, cmd_args: List[str] = []
 ) -> Union[Any, bool]:
     """
-    Actually submit the dag
-    for the moment, we call the commandline condor_submit_dag,
-    but in future we should template-ize the dagman submission file, and
-    just call condor_submit() on it.
+    Actually submit the dag.  jobsub_submit renders the dagman submission
+    file, {f}.condor.sub, from templates, so we just submit() that;
+    for other dags (i.e. our condor_submit_dag wrapper) we run
+    condor_submit_dag -no_submit to make one first.
     """
     subfile = f"{f}.condor.sub"
     if not os.path.exists(subfile):
@@ -213,12 +495,17 @@ def submit_dag(
             f' "use_oauth_services = {vargs["group"]}" -no_submit {f} {qargs}'
         )
 
-        cmd = f"BEARER_TOKEN_FILE={os.environ['BEARER_TOKEN_FILE']} {cmd}"
+        cmd = f"BEARER_TOKEN_FILE={bearer_token_file(vargs)} {cmd}"
         if vargs.get("verbose", 0) > 0:
             print(f"Running: {cmd}")
 
         try:
-            output = subprocess.run(cmd, shell=True, check=False)
+            output = subprocess.run(
+                cmd,
+                shell=True,
+                check=False,
+                cwd=os.path.dirname(f) if os.path.isabs(f) else None,
+            )
             if output.returncode < 0:
                 sys.stderr.write(
                     f"Error: Child was terminated by signal {-output.returncode}"
@@ -258,6 +545,7 @@ class Job:
 
     def __init__(self, job_id: str):
         self.id = job_id
+        self._schedd: Optional[htcondor.htcondor.Schedd] = None
         m = Job._id_regexp.match(job_id)
         if m is None:
             raise JobIdError(f'unable to parse job id "{job_id}"')
@@ -279,11 +567,10 @@ class Job:
         return f"{self.seq}.{self.proc}@{self.schedd}"
 
     def _get_schedd(self) -> htcondor.htcondor.Schedd:
-        c = htcondor.Collector(COLLECTOR_HOST)
-        s = c.locate(htcondor.DaemonTypes.Schedd, self.schedd)
-        if s is None:
-            raise Exception(f'unable to find schedd "{self.schedd}" in HTCondor pool')
-        return htcondor.Schedd(s)
+        # one handle per Job, so several calls on it locate the schedd once
+        if self._schedd is None:
+            self._schedd = get_schedd_handle(self.schedd)
+        return self._schedd
 
     def _constraint(self) -> str:
         q = f"ClusterId=={self.seq}"
@@ -298,14 +585,41 @@ class Job:
         on the schedd (not necessarily process 0).
 
         """
+        res = self.get_attributes([attr])
+        if attr not in res:
+            raise Exception(f'attribute "{attr}" not found for job "{str(self)}"')
+        return res[attr]
+
+    def _query_attributes(
+        self, attrs: List[str], limit: int = -1
+    ) -> Dict[int, Dict[str, Any]]:
+        """the attrs each job has, by ProcId, with one schedd query"""
         s = self._get_schedd()
         q = self._constraint()
-        res = s.query(q, [attr], limit=1)
+        projection = list(dict.fromkeys(list(attrs) + ["ProcId"]))
+        res = s.query(q, projection, limit=limit)
         if len(res) == 0:
             raise Exception(f'job matching "{q}" not found on "{self.schedd}"')
-        if attr not in res[0]:
-            raise Exception(f'attribute "{attr}" not found for job "{str(self)}"')
-        return res[0].eval(attr)
+        return {
+            int(ad["ProcId"]): {a: ad.eval(a) for a in attrs if a in ad} for ad in res
+        }
+
+    def get_attributes(self, attrs: List[str]) -> Dict[str, Any]:
+        """
+        Return the values of several job attributes, with one schedd query,
+        as a dict of the ones the job has.  As with get_attribute, for a
+        cluster they come from the first job found.
+
+        """
+        return next(iter(self._query_attributes(attrs, limit=1).values()))
+
+    def get_proc_attributes(self, attrs: List[str]) -> Dict[int, Dict[str, Any]]:
+        """
+        Like get_attributes, but for each job of a cluster: a dict of the
+        attributes each has, by ProcId.
+
+        """
+        return self._query_attributes(attrs)
 
     def transfer_data(self) -> None:
         """
@@ -319,3 +633,291 @@ class Job:
         self.cluster = True
         s.retrieve(self._constraint())
         self.cluster = ssc
+
+
+class JobSet:
+    """
+    JobSet is a collection of Jobs, possibly on many schedds, for bulk
+    operations: jobs are grouped by schedd, each schedd gets one combined
+    query, and the schedds are queried concurrently.  Per-schedd failures
+    are kept in errors, so one bad schedd doesn't lose the other results.
+
+        js = JobSet(["123@schedd1.example.com", "456.7@schedd2.example.com"])
+        ads = js.get_attributes(["JobStatus", "SUBMIT_Iwd"])
+
+    Constraints for a schedd (add_constraint) pick jobs there as well.
+    """
+
+    jobs: Dict[str, List[Job]]
+    constraints: Dict[str, List[str]]
+    errors: Dict[str, Exception]
+    latencies: Dict[str, float]
+
+    # most schedds we talk to at once
+    max_workers = 16
+
+    def __init__(self, job_ids: Iterable[Union[str, Job]]):
+        self.jobs = {}
+        self.constraints = {}
+        self.errors = {}
+        self.latencies = {}
+        for j in job_ids:
+            job = j if isinstance(j, Job) else Job(j)
+            self.jobs.setdefault(job.schedd, []).append(job)
+
+    def add_constraint(self, schedd_name: str, constraint: str) -> None:
+        """also take the jobs matching constraint on schedd_name"""
+        self.jobs.setdefault(schedd_name, [])
+        self.constraints.setdefault(schedd_name, []).append(constraint)
+
+    def __len__(self) -> int:
+        return sum(len(jl) for jl in self.jobs.values())
+
+    def __iter__(self) -> Iterator[Job]:
+        for jl in self.jobs.values():
+            yield from jl
+
+    @property
+    def schedds(self) -> List[str]:
+        return list(self.jobs)
+
+    def constraint(self, schedd_name: str, whole_clusters: bool = False) -> str:
+        """one constraint for all our jobs on schedd_name"""
+        clusters = set()
+        procs: Dict[int, Set[int]] = {}
+        for j in self.jobs.get(schedd_name, []):
+            if j.cluster or whole_clusters:
+                clusters.add(j.seq)
+            else:
+                procs.setdefault(j.seq, set()).add(j.proc)
+        terms = []
+        if clusters:
+            clist = ",".join(map(str, sorted(clusters)))
+            terms.append(f"member(ClusterId, {{{clist}}})")
+        for seq in sorted(set(procs) - clusters):
+            plist = ",".join(map(str, sorted(procs[seq])))
+            terms.append(f"(ClusterId=={seq} && member(ProcId, {{{plist}}}))")
+        terms.extend(f"({c})" for c in self.constraints.get(schedd_name, []))
+        return " || ".join(terms) if terms else "false"
+
+    def _map_schedds(
+        self, fn: Callable[[str, htcondor.htcondor.Schedd], Any]
+    ) -> Dict[str, Any]:
+        """
+        call fn(schedd_name, schedd) for each of our schedds concurrently,
+        return their results by schedd name; exceptions go in self.errors,
+        and how long each schedd took in self.latencies
+        """
+        self.errors = {}
+        self.latencies = {}
+        results: Dict[str, Any] = {}
+        if not self.jobs:
+            return results
+
+        def _one(schedd_name: str) -> Any:
+            start = time.time()
+            try:
+                return fn(schedd_name, get_schedd_handle(schedd_name))
+            finally:
+                self.latencies[schedd_name] = time.time() - start
+
+        nworkers = min(len(self.jobs), self.max_workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nworkers) as pool:
+            futures = {pool.submit(_one, sn): sn for sn in self.jobs}
+            for fut in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[fut]] = fut.result()
+                # pylint: disable-next=broad-except
+                except Exception as e:
+                    self.errors[futures[fut]] = e
+        return results
+
+    def get_attributes(self, attrs: List[str]) -> Dict[str, classad.ClassAd]:
+        """
+        Return job ads with just attrs (and the ids) for all of our jobs
+        we find, by job id <cluster>.<proc>@<schedd>.  Clusters in the set
+        return all of their jobs.
+        """
+        projection = list(dict.fromkeys(["ClusterId", "ProcId"] + list(attrs)))
+
+        def _query(schedd_name: str, s: htcondor.htcondor.Schedd) -> List[Any]:
+            return list(s.query(self.constraint(schedd_name), projection))
+
+        res: Dict[str, classad.ClassAd] = {}
+        for schedd_name, ads in self._map_schedds(_query).items():
+            for ad in ads:
+                res[f"{ad['ClusterId']}.{ad['ProcId']}@{schedd_name}"] = ad
+        return res
+
+    def get_history(self, attrs: List[str]) -> Dict[str, classad.ClassAd]:
+        """
+        Like get_attributes, but from the schedd history, for our jobs
+        that have left the queue.
+        """
+        projection = list(dict.fromkeys(["ClusterId", "ProcId"] + list(attrs)))
+
+        def _history(schedd_name: str, s: htcondor.htcondor.Schedd) -> List[Any]:
+            jobs = self.jobs[schedd_name]
+            # just the jobs we want, unless we don't know how many that is
+            whole = any(j.cluster for j in jobs) or schedd_name in self.constraints
+            return list(
+                s.history(
+                    self.constraint(schedd_name),
+                    projection,
+                    match=-1 if whole else len(jobs),
+                )
+            )
+
+        res: Dict[str, classad.ClassAd] = {}
+        for schedd_name, ads in self._map_schedds(_history).items():
+            for ad in ads:
+                res[f"{ad['ClusterId']}.{ad['ProcId']}@{schedd_name}"] = ad
+        return res
+
+    def transfer_data(self) -> None:
+        """
+        Transfer the output sandboxes of all of our jobs, whole clusters
+        like Job.transfer_data, one retrieve per schedd.
+        """
+
+        def _retrieve(schedd_name: str, s: htcondor.htcondor.Schedd) -> None:
+            s.retrieve(self.constraint(schedd_name, whole_clusters=True))
+
+        self._map_schedds(_retrieve)
+
+    def act(
+        self, action: "htcondor.JobAction", reason: Optional[str] = None
+    ) -> Dict[str, classad.ClassAd]:
+        """
+        Remove, hold, release, etc. all of our jobs, with one Schedd.act
+        per schedd, all at once.  Returns the result classads (counts of
+        jobs changed, not found, etc.) by schedd.
+        """
+
+        def _act(schedd_name: str, s: htcondor.htcondor.Schedd) -> Any:
+            if reason is None:
+                return s.act(action, self.constraint(schedd_name))
+            return s.act(action, self.constraint(schedd_name), reason)
+
+        return self._map_schedds(_act)
+
+
+def get_jobsub_schedds() -> List[classad.ClassAd]:
+    """classads for every jobsub schedd in the pool, like condor_q -global"""
+    # pylint: disable-next=no-member
+    coll = htcondor.Collector(COLLECTOR_HOST)
+    # pylint: disable-next=no-member
+    return list(
+        coll.query(
+            htcondor.AdTypes.Schedd,
+            constraint="IsJobsubLite==True",
+            projection=SCHEDD_PROJECTION,
+        )
+    )
+
+
+def restriction_constraint(args: List[str], group: Optional[str] = None) -> str:
+    """
+    constraint for a condor_q style restriction list of job ids and user
+    names, or else the jobs of group
+    """
+    terms = []
+    for a in args:
+        if not a:
+            continue
+        m = re.fullmatch(r"(\d+)(?:\.(\d+))?", a)
+        if m and m.group(2):
+            terms.append(f"(ClusterId=={m.group(1)} && ProcId=={m.group(2)})")
+        elif m:
+            terms.append(f"(ClusterId=={m.group(1)})")
+        else:
+            terms.append(f"(Owner=={classad.quote(a)})")
+    if group is not None:
+        terms.append(f"(Jobsub_Group=?={classad.quote(group)})")
+    return " || ".join(terms) if terms else "true"
+
+
+# most classads fan_out() holds before the schedd threads wait for us
+FAN_OUT_QUEUE_SIZE = 1000
+
+
+def fan_out(
+    schedds: Iterable[Union[str, classad.ClassAd]],
+    query: Callable[[htcondor.htcondor.Schedd, str], Iterable[classad.ClassAd]],
+    timeout: Optional[float] = None,
+    errors: Optional[Dict[str, Exception]] = None,
+) -> Iterator[Tuple[str, classad.ClassAd]]:
+    """
+    run query(schedd, schedd name) on all of schedds (names or schedd
+    classads) at once, yielding (schedd name, classad) as they come in
+    from any of them.  A schedd that fails, or hasn't finished within
+    timeout seconds, is put in errors and doesn't hold up the others.
+    """
+    if errors is None:
+        errors = {}
+    # bounded, so schedds answering faster than we use the results wait
+    # for us rather than pile them up in memory
+    results: "queue.Queue[Tuple[str, Any]]" = queue.Queue(FAN_OUT_QUEUE_SIZE)
+
+    def _query(schedd: Union[str, classad.ClassAd], name: str) -> None:
+        try:
+            if isinstance(schedd, str):
+                s = get_schedd_handle(schedd)
+            else:
+                # pylint: disable-next=no-member
+                s = htcondor.Schedd(schedd)
+            for ad in query(s, name):
+                results.put((name, ad))
+            results.put((name, None))
+        # pylint: disable-next=broad-except
+        except Exception as e:
+            results.put((name, e))
+
+    pending = set()
+    for schedd in schedds:
+        name = schedd if isinstance(schedd, str) else str(schedd.get("Name"))
+        pending.add(name)
+        # daemon threads, so a schedd that never answers can't keep us
+        # from exiting
+        threading.Thread(
+            target=_query, args=(schedd, name), name=f"query_{name}", daemon=True
+        ).start()
+
+    deadline = time.time() + timeout if timeout else None
+    while pending:
+        try:
+            wait = None if deadline is None else max(0.0, deadline - time.time())
+            name, item = results.get(timeout=wait)
+        except queue.Empty:
+            break
+        if name not in pending:
+            continue
+        if item is None:
+            pending.discard(name)
+        elif isinstance(item, Exception):
+            errors[name] = item
+            pending.discard(name)
+        else:
+            yield name, item
+
+    for name in pending:
+        errors[name] = TimeoutError(f"no answer from schedd {name} in {timeout}s")
+
+
+def query_jobs(
+    schedds: Iterable[Union[str, classad.ClassAd]],
+    constraint: Union[str, Dict[str, str]],
+    projection: List[str],
+    timeout: Optional[float] = None,
+    errors: Optional[Dict[str, Exception]] = None,
+) -> Iterator[Tuple[str, classad.ClassAd]]:
+    """
+    xquery all of schedds at once, see fan_out().  The constraint may be
+    different for each schedd, by name.
+    """
+
+    def _xquery(s: htcondor.htcondor.Schedd, name: str) -> Iterable[classad.ClassAd]:
+        where = constraint if isinstance(constraint, str) else constraint[name]
+        return s.xquery(where, projection)  # type: ignore
+
+    return fan_out(schedds, _xquery, timeout, errors)
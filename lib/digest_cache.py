@@ -0,0 +1,123 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" local cache of file digests, so an unchanged tarball is hashed once """
+import os
+import os.path
+import sqlite3
+import time
+from typing import Callable, Optional, Tuple
+
+from utils import cache_db, get_cache_dir, trim_lru
+
+# set JOBSUB_DIGEST_CACHE=0 to always hash files
+DIGEST_CACHE = os.getenv("JOBSUB_DIGEST_CACHE", "1") not in ("", "0")
+
+try:
+    # most files we remember digests of; the least recently used go first
+    _DIGEST_CACHE_SIZE_ENV = os.getenv("JOBSUB_DIGEST_CACHE_SIZE", "1000")
+    DIGEST_CACHE_SIZE = int(_DIGEST_CACHE_SIZE_ENV)
+except ValueError:
+    print(
+        "Digest cache variable JOBSUB_DIGEST_CACHE_SIZE must be either unset"
+        " or an integer"
+    )
+    raise
+
+DIGEST_CACHE_FILE = "digests.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (dev, ino, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS digests_used ON digests (used);
+"""
+
+FileKey = Tuple[int, int, int, int]
+
+
+def digest_cache_path() -> str:
+    """path of the digest cache database"""
+    return os.path.join(get_cache_dir(), DIGEST_CACHE_FILE)
+
+
+def file_key(fname: str) -> FileKey:
+    """what has to stay the same for a file's digest to still hold"""
+    st = os.stat(fname)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def lookup(key: FileKey) -> Optional[str]:
+    """the digest we saw for key, if any, marking it used"""
+    if not DIGEST_CACHE:
+        return None
+    try:
+        with cache_db(DIGEST_CACHE_FILE, SCHEMA) as conn:
+            row = conn.execute(
+                "SELECT sha256 FROM digests"
+                " WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE digests SET used = ?"
+                " WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                (time.time(),) + key,
+            )
+            return str(row[0])
+    except (sqlite3.Error, OSError):
+        return None
+
+
+def store(key: FileKey, sha256: str) -> None:
+    """remember the digest for key, dropping the least recently used"""
+    if not DIGEST_CACHE:
+        return
+    try:
+        with cache_db(DIGEST_CACHE_FILE, SCHEMA) as conn:
+            # a file rewritten in place keeps its inode, so its old
+            # digests can go now
+            conn.execute(
+                "DELETE FROM digests WHERE dev = ? AND ino = ?", (key[0], key[1])
+            )
+            conn.execute(
+                "INSERT INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                key + (sha256, time.time()),
+            )
+            trim_lru(conn, "digests", DIGEST_CACHE_SIZE)
+    except (sqlite3.Error, OSError):
+        pass
+
+
+def cached_digest(fname: str, compute: Callable[[str], str]) -> str:
+    """
+    the digest compute(fname) gives, from the cache if fname hasn't
+    changed since we last computed it
+    """
+    key = file_key(fname)
+    digest = lookup(key)
+    if digest is None:
+        digest = compute(fname)
+        # only trust it if the file didn't change while we read it
+        if file_key(fname) == key:
+            store(key, digest)
+    return digest
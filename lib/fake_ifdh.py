@@ -31,6 +31,8 @@ from typing import Union, Optional, List, Dict, Any
 
 import htcondor  # type: ignore
 
+import timings
+
 VAULT_OPTS = htcondor.param.get("SEC_CREDENTIAL_GETTOKEN_OPTS", "")
 DEFAULT_ROLE = "Analysis"
 
@@ -105,6 +107,7 @@ def checkToken(tokenfile: str) -> bool:
         raise
 
 
+@timings.timed("fake_ifdh.getToken")
 def getToken(role: str = DEFAULT_ROLE, verbose: int = 0) -> str:
     """get path to token file"""
     pid = os.getuid()
@@ -142,6 +145,7 @@ def getToken(role: str = DEFAULT_ROLE, verbose: int = 0) -> str:
     return tokenfile
 
 
+@timings.timed("fake_ifdh.getProxy")
 def getProxy(
     role: str = DEFAULT_ROLE, verbose: int = 0, force_proxy: bool = False
 ) -> str:
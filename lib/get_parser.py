@@ -21,7 +21,7 @@ import re
 import sys
 from typing import Union, Any
 
-from utils import DEFAULT_USAGE_MODELS
+from utils import DEFAULT_USAGE_MODELS, SCHEDD_SELECTION_POLICIES
 
 
 def verify_executable_starts_with_file_colon(s: str) -> str:
@@ -136,12 +136,32 @@ def get_parser() -> argparse.ArgumentParser:
         "--append_condor_requirements",
         help="append condor requirements",
     )
+    parser.add_argument(
+        "--arg_matrix",
+        "--arg-matrix",
+        action="append",
+        default=[],
+        help="NAME=VALUE1,VALUE2,... queue a job for each VALUE, with $NAME"
+        " set to it in the job environment.  Several --arg-matrix options"
+        " (and --queue-from) queue every combination, all in one cluster, so"
+        " not with --dag or --dataset-definition",
+    )
     parser.add_argument(
         "--blacklist", help="enusure that jobs do not land at these sites"
     )
     parser.add_argument("-r", help="Experiment release version")
     parser.add_argument("-i", help="Experiment release dir")
     parser.add_argument("-t", help="Experiment test release dir")
+    parser.add_argument(
+        "--canonical-tar",
+        action="store_true",
+        default=False,
+        help="make tardir: and dropbox: tarballs canonical: files in name order,"
+        " with fixed times, owners and permissions, and hard links stored as"
+        " files, so the same files make the same tarball (with the same zlib"
+        " build), and reuse an earlier upload of it (yours or anyone's in"
+        " your group)",
+    )
     parser.add_argument(
         "--cmtconfig",
         help=" Set up minervasoft release built with cmt configuration. default is $CMTCONFIG",
@@ -268,6 +288,16 @@ def get_parser() -> argparse.ArgumentParser:
         default="",
         help="Project name for --dataset-definition DAGs to share",
     )
+    parser.add_argument(
+        "--queue_from",
+        "--queue-from",
+        default=None,
+        help="queue a job for each line of QUEUE_FROM, all in one cluster. The"
+        " first line names the variables, separated by commas or spaces; each"
+        " line after that has their values for one job, which it gets in its"
+        " environment.  Combined with -N, each line gets N jobs.  Not with --dag"
+        " or --dataset-definition",
+    )
     parser.add_argument(
         "-Q",
         "--mail_never",
@@ -301,11 +331,14 @@ def get_parser() -> argparse.ArgumentParser:
         help="max number of jobs running concurrently at given time.  Use in"
         " conjunction with -N option to protect a shared resource. Example:"
         " jobsub -N 1000 -maxConcurrent 20 will only run 20 jobs at a time"
-        " until all 1000 have completed. This is implemented by running the"
-        " jobs in a DAG. Normally when jobs are run with the -N option, they"
-        " all have the same $CLUSTER number and differing, sequential"
-        " $PROCESS numbers, and many submission scripts take advantage of this."
-        " When jobs are run with this option in a DAG each job has a different"
+        " until all 1000 have completed. This is implemented with condor late"
+        " materialization: the jobs are one cluster, numbered as usual with -N,"
+        " and the schedd only creates 20 of them at a time. If the schedd does"
+        " not support that, the jobs are run in a DAG. Normally when jobs are"
+        " run with the -N option, they all have the same $CLUSTER number and"
+        " differing, sequential $PROCESS numbers, and many submission scripts"
+        " take advantage of this. When jobs are run with this option in a DAG"
+        " each job has a different"
         " $CLUSTER number and a $PROCESS number of 0, which may break scripts"
         " that rely on the normal -N numbering scheme for $CLUSTER and $PROCESS."
         " Groups of jobs run with this option will have the same"
@@ -389,11 +422,38 @@ def get_parser() -> argparse.ArgumentParser:
         " $INPUT_TAR_DIR_LOCAL environment variable, rather than $INPUT_TAR_FILE",
     )
 
+    parser.add_argument(
+        "--schedd-selection",
+        default=None,
+        choices=SCHEDD_SELECTION_POLICIES,
+        help="how to pick the schedd(s) to submit to: random, weighted (less"
+        " loaded schedds more likely) or p2c (the less loaded of two picked at"
+        " random).  Defaults to $JOBSUB_SCHEDD_SELECTION, or random.",
+    )
+    parser.add_argument(
+        "--spread-schedds",
+        default=None,
+        help="split the -N jobs into SPREAD_SCHEDDS clusters on that many"
+        " schedds, submitted at the same time. Job numbering ($JOBSUBJOBSECTION)"
+        " runs across all of them, and the job id printed at the end refers to"
+        " all of them for jobsub_q, jobsub_rm, etc.",
+    )
     parser.add_argument(
         "--tarball-exclusion-file",
         default=None,
         help="File with patterns to exclude from tarffile creation",
     )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help="print how long each phase of the submission took",
+    )
+    parser.add_argument(
+        "--timings-json",
+        default=None,
+        help="also write the --timings breakdown to this file as JSON",
+    )
     parser.add_argument(
         "--timeout",
         help="kill user job if still running after NUMBER[UNITS] of time."
@@ -0,0 +1,307 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" job history from all the jobsub schedds, with cursors and a local index """
+import os
+import os.path
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import classad  # type: ignore
+
+import condor
+from utils import cache_db, get_cache_dir
+
+HISTORY_FILE = "history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    name TEXT NOT NULL,
+    schedd TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    proc INTEGER NOT NULL,
+    completion_date INTEGER,
+    time REAL NOT NULL,
+    PRIMARY KEY (name, schedd)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    jobsub_job_id TEXT PRIMARY KEY,
+    schedd TEXT,
+    owner TEXT,
+    grp TEXT,
+    jobsub_cmd TEXT,
+    args TEXT,
+    qdate INTEGER,
+    completion_date INTEGER,
+    job_status INTEGER,
+    exit_code INTEGER,
+    wall_time REAL,
+    cpu_time REAL,
+    image_size INTEGER,
+    ad TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_qdate ON jobs (qdate);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner);
+CREATE INDEX IF NOT EXISTS jobs_jobsub_cmd ON jobs (jobsub_cmd);
+CREATE INDEX IF NOT EXISTS jobs_exit_code ON jobs (exit_code);
+"""
+
+# what a cursor needs from each history record
+CURSOR_ATTRS = ["ClusterId", "ProcId", "CompletionDate"]
+
+# most jobs a plain jobsub_history lists from each schedd, newest first,
+# when nothing else (job ids, --qdate-ge, --cursor) narrows it down
+DEFAULT_LIMIT = 1000
+
+# cursor the harvester keeps its place in the schedds' history with
+HARVEST_CURSOR = "harvest"
+
+# job ad attributes kept in the local index, and the columns they go in
+INDEX_COLUMNS = {
+    "JobsubJobId": "jobsub_job_id",
+    "Owner": "owner",
+    "Jobsub_Group": "grp",
+    "JobsubCmd": "jobsub_cmd",
+    "Args": "args",
+    "QDate": "qdate",
+    "CompletionDate": "completion_date",
+    "JobStatus": "job_status",
+    "ExitCode": "exit_code",
+    "RemoteWallClockTime": "wall_time",
+    "RemoteUserCpu": "cpu_time",
+    "ImageSize": "image_size",
+}
+INDEX_PROJECTION = list(INDEX_COLUMNS) + ["GlobalJobId", "Cmd"]
+
+# what jobsub_history --local --summary can group by
+SUMMARY_GROUPS = {
+    "cmd": "jobsub_cmd",
+    "owner": "owner",
+    "group": "grp",
+    "schedd": "schedd",
+    "exitcode": "exit_code",
+    "day": "date(completion_date, 'unixepoch', 'localtime')",
+}
+
+
+def history_path() -> str:
+    """path of the local history database"""
+    return os.path.join(get_cache_dir(), HISTORY_FILE)
+
+
+def cursor_key(name: str, constraint: str) -> str:
+    """a cursor only makes sense for the same constraint"""
+    return f"{name}|{constraint}"
+
+
+def load_cursors(key: str) -> Dict[str, Tuple[int, int]]:
+    """(cluster, proc) of the newest record we've seen, by schedd"""
+    with cache_db(HISTORY_FILE, SCHEMA) as conn:
+        return {
+            schedd: (cluster, proc)
+            for schedd, cluster, proc in conn.execute(
+                "SELECT schedd, cluster, proc FROM cursors WHERE name = ?", (key,)
+            )
+        }
+
+
+def save_cursors(key: str, newest: Dict[str, classad.ClassAd]) -> None:
+    """remember the newest record seen on each schedd for next time"""
+    with cache_db(HISTORY_FILE, SCHEMA) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO cursors VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    key,
+                    schedd,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                    ad.get("CompletionDate"),
+                    time.time(),
+                )
+                for schedd, ad in newest.items()
+            ],
+        )
+
+
+def query_history(
+    schedds: Iterable[Union[str, classad.ClassAd]],
+    constraint: str,
+    projection: List[str],
+    cursor: Optional[str] = None,
+    match: int = -1,
+    timeout: Optional[float] = None,
+    errors: Optional[Dict[str, Exception]] = None,
+) -> Iterator[Tuple[str, classad.ClassAd]]:
+    """
+    history records from all of schedds at once, newest first for each
+    schedd, see condor.fan_out().  With a cursor name, only records newer
+    than the ones the last query with that cursor (and constraint) saw
+    come back, so the schedds stop reading their history files there;
+    the cursor moves on for each schedd that answered.
+    """
+    if errors is None:
+        errors = {}
+    key = cursor_key(cursor, constraint) if cursor else ""
+    since = load_cursors(key) if cursor else {}
+    projection = list(dict.fromkeys(projection + CURSOR_ATTRS))
+
+    def _history(s: Any, name: str) -> Iterable[classad.ClassAd]:
+        last = since.get(name)
+        return s.history(  # type: ignore
+            constraint,
+            projection,
+            match=match,
+            since=f"{last[0]}.{last[1]}" if last else None,
+        )
+
+    newest: Dict[str, classad.ClassAd] = {}
+    for name, ad in condor.fan_out(schedds, _history, timeout, errors):
+        newest.setdefault(name, ad)
+        yield name, ad
+
+    if cursor:
+        save_cursors(key, {n: ad for n, ad in newest.items() if n not in errors})
+
+
+def _index_row(schedd: str, ad: classad.ClassAd) -> Tuple[Any, ...]:
+    """a jobs table row for a history record from schedd"""
+    vals: Dict[str, Any] = {}
+    for attr, col in INDEX_COLUMNS.items():
+        try:
+            v = ad.eval(attr)
+        except KeyError:
+            v = None
+        vals[col] = None if isinstance(v, classad.Value) else v
+    if not vals["jobsub_job_id"]:
+        vals["jobsub_job_id"] = f"{ad['ClusterId']}.{ad['ProcId']}@{schedd}"
+    if not vals["jobsub_cmd"]:
+        vals["jobsub_cmd"] = os.path.basename(str(ad.get("Cmd", "")))
+    return (
+        vals["jobsub_job_id"],
+        schedd,
+        vals["owner"],
+        vals["grp"],
+        vals["jobsub_cmd"],
+        vals["args"],
+        vals["qdate"],
+        vals["completion_date"],
+        vals["job_status"],
+        vals["exit_code"],
+        vals["wall_time"],
+        vals["cpu_time"],
+        vals["image_size"],
+        ad.printOld(),
+    )
+
+
+def harvest(
+    schedds: Iterable[Union[str, classad.ClassAd]],
+    constraint: str,
+    timeout: Optional[float] = None,
+    errors: Optional[Dict[str, Exception]] = None,
+) -> int:
+    """
+    add the jobs that finished on schedds since the last harvest to the
+    local index, return how many there were
+    """
+    rows = [
+        _index_row(name, ad)
+        for name, ad in query_history(
+            schedds,
+            constraint,
+            INDEX_PROJECTION,
+            cursor=HARVEST_CURSOR,
+            timeout=timeout,
+            errors=errors,
+        )
+    ]
+    with cache_db(HISTORY_FILE, SCHEMA) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO jobs VALUES"
+            " (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
+
+def _local_where(
+    args: List[str], group: Optional[str], qdate_range: Tuple[int, int]
+) -> Tuple[str, List[Any]]:
+    """SQL for a restriction list like condor.restriction_constraint()"""
+    terms: List[str] = []
+    params: List[Any] = []
+    for a in args:
+        if not a:
+            continue
+        if a[0].isdigit():
+            # jobsub job ids are cluster.proc@schedd
+            cluster_proc = a if "." in a else f"{a}.%"
+            terms.append("jobsub_job_id LIKE ?")
+            params.append(f"{cluster_proc}@%")
+        else:
+            terms.append("owner = ?")
+            params.append(a)
+    if not terms and group is not None:
+        terms.append("grp = ?")
+        params.append(group)
+    where = f"({' OR '.join(terms)})" if terms else "1"
+    where += " AND qdate >= ? AND qdate <= ?"
+    params.extend(qdate_range)
+    return where, params
+
+
+def local_jobs(
+    args: List[str],
+    group: Optional[str] = None,
+    qdate_range: Tuple[int, int] = (0, 2**62),
+) -> List[classad.ClassAd]:
+    """
+    job ads from the local index, newest first, for job ids and users in
+    args, or else the jobs of group, with a qdate in qdate_range
+    """
+    where, params = _local_where(args, group, qdate_range)
+    with cache_db(HISTORY_FILE, SCHEMA) as conn:
+        return [
+            classad.parseOne(ad)
+            for (ad,) in conn.execute(
+                f"SELECT ad FROM jobs WHERE {where} ORDER BY completion_date DESC",
+                params,
+            )
+        ]
+
+
+def local_summary(
+    by: str,
+    args: List[str],
+    group: Optional[str] = None,
+    qdate_range: Tuple[int, int] = (0, 2**62),
+) -> List[Tuple[Any, ...]]:
+    """
+    aggregates over the local index, grouped by one of SUMMARY_GROUPS:
+    (key, jobs, failed, mean wall time, mean cpu time, max image size)
+    """
+    where, params = _local_where(args, group, qdate_range)
+    key = SUMMARY_GROUPS[by]
+    with cache_db(HISTORY_FILE, SCHEMA) as conn:
+        return list(
+            conn.execute(
+                f"SELECT {key}, COUNT(*),"
+                " SUM(job_status != 4 OR COALESCE(exit_code, 0) != 0),"
+                " AVG(wall_time), AVG(cpu_time), MAX(image_size)"
+                f" FROM jobs WHERE {where} GROUP BY 1 ORDER BY 2 DESC",
+                params,
+            )
+        )
@@ -0,0 +1,237 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" format job classads like the jobsub_q / jobsub_history listings """
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import classad  # type: ignore
+
+# the job attributes the default jobsub_q listing shows, so queries need
+# only bring back these
+Q_PROJECTION = [
+    "GlobalJobId",
+    "DAGNodeName",
+    "Owner",
+    "QDate",
+    "RemoteWallClockTime",
+    "JobStatus",
+    "JobPrio",
+    "ImageSize",
+    "JobsubCmd",
+    "Cmd",
+    "Args",
+    "Arguments",
+]
+
+Q_HEADER = (
+    "JOBSUBJOBID                             OWNER       \tSUBMITTED     RUNTIME"
+    "   ST PRIO   SIZE  COMMAND"
+)
+
+# JobStatus as a letter, like substr("UIRXCHE",JobStatus,1)
+STATUS_LETTERS = "UIRXCHE"
+
+
+def _get(ad: classad.ClassAd, attr: str) -> Optional[Any]:
+    """attribute value, or None if it is missing or undefined"""
+    try:
+        v = ad.eval(attr)
+    except KeyError:
+        return None
+    if isinstance(v, classad.Value):
+        return None
+    return v
+
+
+def jobsub_id(ad: classad.ClassAd) -> str:
+    """cluster.proc@schedd from GlobalJobId schedd#cluster.proc#qdate"""
+    gjid = _get(ad, "GlobalJobId")
+    if gjid:
+        parts = str(gjid).split("#")
+        if len(parts) > 1:
+            return f"{parts[1]}@{parts[0]}"
+    return f"{_get(ad, 'ClusterId')}.{_get(ad, 'ProcId')}"
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """seconds as days+hh:mm:ss, like condor's %T"""
+    s = int(seconds or 0)
+    return f"{s // 86400}+{s // 3600 % 24:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+
+
+def format_date(t: Optional[float]) -> str:
+    """month/day hour:minute in local time"""
+    if t is None:
+        return ""
+    return time.strftime("%m/%d %H:%M", time.localtime(int(t)))
+
+
+def status_letter(ad: classad.ClassAd) -> str:
+    st = _get(ad, "JobStatus")
+    if isinstance(st, int) and 0 <= st < len(STATUS_LETTERS):
+        return STATUS_LETTERS[st]
+    return ""
+
+
+def format_q_row(ad: classad.ClassAd) -> str:
+    """
+    one line of the default jobsub_q listing for job classad ad; like
+    condor_q -format, columns whose attributes are undefined are left out
+    """
+    node = _get(ad, "DAGNodeName")
+    owner = f" |-{node}" if node else _get(ad, "Owner")
+    qdate = _get(ad, "QDate")
+    runtime = _get(ad, "RemoteWallClockTime")
+    prio = _get(ad, "JobPrio")
+    size = _get(ad, "ImageSize")
+    line = f"{jobsub_id(ad):<40s}"
+    if owner is not None:
+        line += f"{owner:<10s}\t"
+    if qdate is not None:
+        line += f"{format_date(qdate):<11s} "
+    if runtime is not None:
+        line += f"{format_duration(runtime)} "
+    if status_letter(ad):
+        line += f" {status_letter(ad)} "
+    if prio is not None:
+        line += f" {prio:3d} "
+    if size is not None:
+        line += f"{size / 1024.0:6.1f} "
+    line += f"{_get(ad, 'JobsubCmd') or _get(ad, 'Cmd') or ''}"
+    for attr in ("Args", "Arguments"):
+        v = _get(ad, attr)
+        if v is not None:
+            line += f" {str(v)[:20]}"
+    return line
+
+
+# the job attributes the default jobsub_history listing shows
+HISTORY_PROJECTION = [
+    "GlobalJobId",
+    "Owner",
+    "QDate",
+    "CompletionDate",
+    "JobStatus",
+    "JobsubCmd",
+    "Args",
+]
+
+HISTORY_HEADER = (
+    "JOBSUBJOBID                             OWNER                SUBMITTED"
+    "           FINISHED            ST       CMD"
+)
+
+
+def format_history_row(ad: classad.ClassAd) -> str:
+    """one line of the default jobsub_history listing for job classad ad"""
+    line = (
+        f"{jobsub_id(ad):<30s}"
+        f"{_get(ad, 'Owner') or '':<10s}\t"
+        f"{format_date(_get(ad, 'QDate')):<11s} "
+        f"{format_date(_get(ad, 'CompletionDate') or None):<11s} "
+        f" {status_letter(ad)} "
+        f"{_get(ad, 'JobsubCmd') or ''}"
+    )
+    args = _get(ad, "Args")
+    if args is not None:
+        line += f" {str(args)[:20]}"
+    return line
+
+
+# all jobsub_q --summary needs to count jobs
+SUMMARY_PROJECTION = ["ClusterId", "JobStatus", "DAGManJobId"]
+
+# JobStatus columns in the summary, the rest count as other
+SUMMARY_COLUMNS = {1: "IDLE", 2: "RUN", 5: "HELD", 4: "DONE", 3: "REMOVED"}
+
+
+class QueueSummary:
+    """
+    counts of jobs by status for each cluster (or the DAG they are nodes
+    of) on each schedd.  Memory goes with the number of clusters, not
+    jobs, so ads can be streamed through add().
+    """
+
+    def __init__(self) -> None:
+        self.counts: Dict[Tuple[str, int, bool], List[int]] = {}
+
+    def add(self, schedd: str, ad: classad.ClassAd) -> None:
+        dag = _get(ad, "DAGManJobId")
+        cluster = int(dag) if dag is not None else int(ad["ClusterId"])
+        row = self.counts.setdefault(
+            (schedd, cluster, dag is not None), [0] * (len(SUMMARY_COLUMNS) + 1)
+        )
+        status = _get(ad, "JobStatus")
+        if status in SUMMARY_COLUMNS:
+            row[list(SUMMARY_COLUMNS).index(status)] += 1
+        else:
+            row[-1] += 1
+
+    def lines(self) -> List[str]:
+        """the summary table, with totals for each schedd and overall"""
+        header = f"{'CLUSTER':<40s} {'TOTAL':>8s}" + "".join(
+            f" {c:>8s}" for c in list(SUMMARY_COLUMNS.values()) + ["OTHER"]
+        )
+        res = [header]
+
+        def _line(label: str, row: List[int]) -> str:
+            return f"{label:<40s} {sum(row):8d}" + "".join(f" {n:8d}" for n in row)
+
+        total = [0] * (len(SUMMARY_COLUMNS) + 1)
+        for schedd in sorted({k[0] for k in self.counts}):
+            sched_total = [0] * len(total)
+            for key in sorted(k for k in self.counts if k[0] == schedd):
+                row = self.counts[key]
+                label = f"{key[1]}@{schedd}" + (" (DAG)" if key[2] else "")
+                res.append(_line(label, row))
+                sched_total = [a + b for a, b in zip(sched_total, row)]
+            res.append(_line(f"total {schedd}", sched_total))
+            total = [a + b for a, b in zip(total, sched_total)]
+        res.append(_line("total", total))
+        return res
+
+
+def parse_attrs(attrs: Optional[str]) -> List[str]:
+    """attribute names from a comma (or space) separated list"""
+    return [a for a in (attrs or "").replace(",", " ").split() if a]
+
+
+def _json_value(v: Any) -> Any:
+    """a classad value as something json can write"""
+    if isinstance(v, classad.Value):
+        return None
+    if isinstance(v, (str, int, float, bool)) or v is None:
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_json_value(x) for x in v]
+    if isinstance(v, classad.ClassAd):
+        return {k: _json_value(x) for k, x in v.items()}
+    return str(v)
+
+
+def format_jsonl(ad: classad.ClassAd, attrs: Optional[List[str]] = None) -> str:
+    """
+    job classad ad as one line of compact JSON, with just attrs (in that
+    order, null if not there), or everything in the ad
+    """
+    obj = {}
+    for attr in attrs or list(ad.keys()):
+        try:
+            obj[attr] = _json_value(ad.eval(attr))
+        except KeyError:
+            obj[attr] = None
+    return json.dumps(obj, separators=(",", ":"))
@@ -0,0 +1,274 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" wait for many jobs at once, from their event logs or the schedds """
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import classad  # type: ignore
+import htcondor  # type: ignore
+
+import condor
+
+# JobStatus values where a job is done with, as far as waiting goes
+DONE_STATUSES = {3: "removed", 4: "completed"}
+
+# status of a job that left the queue, but isn't in the schedd history
+LEFT_QUEUE = "left queue"
+
+# status of a job that was never in the queue while we looked, and isn't
+# in the schedd history either (say, a mistyped job id)
+NOT_FOUND = "not found"
+
+# job attributes we need to tell if (and how) a job is done
+WAIT_PROJECTION = ["JobStatus", "ExitCode", "ExitBySignal", "ExitSignal"]
+
+JobResult = Dict[str, Any]
+
+
+class LogFollower:
+    """
+    follows one job event log, picking up where it left off each time;
+    reading a log costs no schedd queries.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, path: str):
+        self.path = path
+        # pylint: disable-next=no-member
+        self.jel = htcondor.JobEventLog(path)
+        self.submitted: Set[Tuple[int, int]] = set()
+        self.finished: Dict[Tuple[int, int], Tuple[str, Optional[int]]] = {}
+
+    def poll(self) -> List[Tuple[int, int, str, Optional[int]]]:
+        """
+        read any new events, return (cluster, proc, status, exit code)
+        for the jobs that finished since the last poll
+        """
+        res = []
+        for ev in self.jel.events(stop_after=0):
+            key = (ev.cluster, ev.proc)
+            # pylint: disable-next=no-member
+            jet = htcondor.JobEventType
+            if ev.type == jet.SUBMIT:
+                self.submitted.add(key)
+                continue
+            if ev.type == jet.JOB_TERMINATED:
+                if ev.get("TerminatedNormally", True):
+                    done = ("completed", ev.get("ReturnValue", None))
+                else:
+                    done = ("signaled", None)
+            elif ev.type == jet.JOB_ABORTED:
+                done = ("removed", None)
+            else:
+                continue
+            if key not in self.finished:
+                self.finished[key] = done
+                res.append((ev.cluster, ev.proc, done[0], done[1]))
+        return res
+
+    def clusters(self) -> Set[int]:
+        """clusters submitted to this log so far"""
+        return {c for c, _ in self.submitted}
+
+    def cluster_done(self, cluster: int, proc: Optional[int] = None) -> bool:
+        """have all of the jobs of cluster (or just cluster.proc) finished?"""
+        jobs = [
+            k
+            for k in self.submitted
+            if k[0] == cluster and (proc is None or k[1] == proc)
+        ]
+        return bool(jobs) and all(k in self.finished for k in jobs)
+
+
+class Waiter:
+    """
+    Waiter waits for any number of clusters, jobs, or DAGs (which are
+    the cluster of their dagman job), calling on_done for each job as it
+    finishes.  Clusters found in a local event log are followed there,
+    which costs no schedd queries; the rest are polled, with one query
+    per schedd for all of them at once (see condor.JobSet).
+    """
+
+    def __init__(
+        self,
+        jobs: List[condor.Job],
+        logs: Optional[List[str]] = None,
+        interval: float = 30.0,
+        on_done: Optional[Callable[[JobResult], None]] = None,
+    ):
+        self.interval = interval
+        self.on_done = on_done
+        self.followers = [LogFollower(p) for p in logs or []]
+        for f in self.followers:
+            f.poll()
+        self.results: Dict[str, JobResult] = {}
+        # targets followed in a log, and targets we ask the schedds about
+        self.logged: Dict[str, Tuple[LogFollower, int, Optional[int]]] = {}
+        self.polled: Dict[str, condor.Job] = {}
+        # jobs we've seen in the queue for each polled target
+        self.seen: Dict[str, Set[str]] = {}
+        self.done: Set[str] = set()
+        self.schedd_queries = 0
+
+        for j in jobs:
+            proc = None if j.cluster else j.proc
+            follower: Optional[LogFollower] = next(
+                (f for f in self.followers if j.seq in f.clusters()), None
+            )
+            if follower:
+                self.logged[j.id] = (follower, j.seq, proc)
+            else:
+                self.polled[j.id] = j
+        if not jobs:
+            # just wait for everything in the logs
+            for f in self.followers:
+                for c in sorted(f.clusters()):
+                    self.logged[str(c)] = (f, c, None)
+
+        # report what already finished before we started
+        for f in self.followers:
+            for (c, p), (status, code) in sorted(f.finished.items()):
+                self._finish(f"{c}.{p}", status, code)
+
+    def _finish(self, jid: str, status: str, exit_code: Optional[int]) -> None:
+        if jid in self.results:
+            return
+        self.results[jid] = {"id": jid, "status": status, "exit_code": exit_code}
+        if self.on_done:
+            self.on_done(self.results[jid])
+
+    def _poll_logs(self) -> None:
+        for f in self.followers:
+            for c, p, status, code in f.poll():
+                self._finish(f"{c}.{p}", status, code)
+        for tid, (follower, cluster, proc) in self.logged.items():
+            if follower.cluster_done(cluster, proc):
+                self.done.add(tid)
+
+    def _finish_ad(self, jid: str, ad: classad.ClassAd) -> bool:
+        """finish jid if its ad says it is done, return whether it was"""
+        status = DONE_STATUSES.get(ad.get("JobStatus"))
+        if status is None:
+            return False
+        if ad.get("ExitBySignal", False):
+            self._finish(jid, "signaled", None)
+        else:
+            self._finish(jid, status, ad.get("ExitCode", None))
+        return True
+
+    @staticmethod
+    def _ads_for(
+        j: condor.Job, ads: Dict[str, classad.ClassAd]
+    ) -> Dict[str, classad.ClassAd]:
+        """the ads (by job id) for the job, or all of the cluster, j"""
+        return {
+            jid: ad
+            for jid, ad in ads.items()
+            if jid.endswith(f"@{j.schedd}")
+            and ad["ClusterId"] == j.seq
+            and (j.cluster or ad["ProcId"] == j.proc)
+        }
+
+    def _finish_gone(self, gone: List[Tuple[condor.Job, str]]) -> None:
+        """
+        finish jobs (or whole clusters) that aren't in the queue, going by
+        the schedd history; jobs not there (or on schedds we can't ask)
+        finish with the status given with them
+        """
+        js = condor.JobSet([j for j, _ in gone])
+        self.schedd_queries += len(js.schedds)
+        ads = js.get_history(WAIT_PROJECTION)
+        for j, missing in gone:
+            found = self._ads_for(j, ads)
+            for jid, ad in sorted(found.items()):
+                if not self._finish_ad(jid, ad):
+                    self._finish(jid, missing, None)
+            if not found:
+                self._finish(j.id, missing, None)
+
+    def _poll_schedds(self) -> None:
+        pending = [j for tid, j in self.polled.items() if tid not in self.done]
+        if not pending:
+            return
+        js = condor.JobSet(pending)
+        self.schedd_queries += len(js.schedds)
+        ads = js.get_attributes(WAIT_PROJECTION)
+        gone: List[Tuple[condor.Job, str]] = []
+        for tid, j in self.polled.items():
+            if tid in self.done or j.schedd in js.errors:
+                continue
+            mine = self._ads_for(j, ads)
+            if not mine and tid not in self.seen:
+                # never in the queue while we looked: it finished before
+                # we started, or there is no such job
+                gone.append((j, NOT_FOUND))
+                self.done.add(tid)
+                continue
+            # jobs that have left the queue since we last looked are done,
+            # how is up to the history
+            gone.extend(
+                (condor.Job(jid), LEFT_QUEUE)
+                for jid in sorted(self.seen.get(tid, set()) - set(mine))
+                if jid not in self.results
+            )
+            self.seen[tid] = set(mine)
+            running = False
+            for jid, ad in mine.items():
+                if not self._finish_ad(jid, ad):
+                    running = True
+            if not running:
+                self.done.add(tid)
+        if gone:
+            self._finish_gone(gone)
+
+    def pending(self) -> List[str]:
+        """targets we are still waiting for"""
+        return [t for t in list(self.logged) + list(self.polled) if t not in self.done]
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        wait until all of our targets are done, or for timeout seconds;
+        returns True if they are all done.
+        """
+        deadline = time.time() + timeout if timeout else None
+        next_query = 0.0
+        while True:
+            self._poll_logs()
+            if self.polled and time.time() >= next_query:
+                self._poll_schedds()
+                next_query = time.time() + self.interval
+            if not self.pending():
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            # logs are cheap to check often, the schedds are not
+            nap = 1.0 if self.followers else self.interval
+            if deadline is not None:
+                nap = min(nap, max(0.0, deadline - time.time()))
+            time.sleep(nap)
+
+    def summary(self) -> Dict[str, int]:
+        """
+        counts of finished jobs by status, plus failed: all but the ones
+        completed with exit code 0 (or none we know of)
+        """
+        counts: Dict[str, int] = {"failed": 0}
+        for r in self.results.values():
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+            if r["status"] != "completed" or r["exit_code"] not in (0, None):
+                counts["failed"] += 1
+        return counts
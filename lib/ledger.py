@@ -0,0 +1,126 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" local ledger of our submissions, so we know which schedds have our jobs """
+import os
+import os.path
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from utils import cache_db, get_cache_dir
+
+# set JOBSUB_LEDGER=0 to neither record nor use submissions
+LEDGER = os.getenv("JOBSUB_LEDGER", "1") not in ("", "0")
+
+try:
+    # seconds after which we assume a submission's jobs are long gone
+    _LEDGER_MAX_AGE_ENV = os.getenv("JOBSUB_LEDGER_MAX_AGE", str(30 * 86400))
+    LEDGER_MAX_AGE = int(_LEDGER_MAX_AGE_ENV)
+except ValueError:
+    print("Ledger variable JOBSUB_LEDGER_MAX_AGE must be either unset or an integer")
+    raise
+
+LEDGER_FILE = "ledger.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    schedd TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    njobs INTEGER,
+    dag INTEGER NOT NULL DEFAULT 0,
+    time REAL NOT NULL,
+    grp TEXT,
+    PRIMARY KEY (schedd, cluster)
+);
+CREATE INDEX IF NOT EXISTS submissions_time ON submissions (time);
+"""
+
+
+def ledger_path() -> str:
+    """path of the ledger database"""
+    return os.path.join(get_cache_dir(), LEDGER_FILE)
+
+
+def record(
+    schedd: str,
+    cluster: int,
+    njobs: Optional[int] = None,
+    dag: bool = False,
+    group: Optional[str] = None,
+    verbose: int = 0,
+) -> None:
+    """
+    add a submission to the ledger.  The ledger is only a hint, so
+    failing to write it is not an error.
+    """
+    if not LEDGER:
+        return
+    try:
+        with cache_db(LEDGER_FILE, SCHEMA) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?)",
+                (schedd, int(cluster), njobs, int(dag), time.time(), group),
+            )
+            conn.execute(
+                "DELETE FROM submissions WHERE time < ?",
+                (time.time() - LEDGER_MAX_AGE,),
+            )
+    except (sqlite3.Error, OSError, ValueError) as e:
+        if verbose > 0:
+            sys.stderr.write(f"Notice: could not record submission in ledger: {e}\n")
+
+
+def live_clusters(group: Optional[str] = None) -> Dict[str, Set[int]]:
+    """
+    clusters we submitted recently enough that they may still be in the
+    queue, by schedd, for group (or every group).  Empty if the ledger is
+    off or unreadable.
+    """
+    if not LEDGER:
+        return {}
+    query = "SELECT schedd, cluster FROM submissions WHERE time >= ?"
+    params: List[object] = [time.time() - LEDGER_MAX_AGE]
+    if group is not None:
+        query += " AND grp = ?"
+        params.append(group)
+    res: Dict[str, Set[int]] = {}
+    try:
+        with cache_db(LEDGER_FILE, SCHEMA) as conn:
+            for schedd, cluster in conn.execute(query, params):
+                res.setdefault(schedd, set()).add(cluster)
+    except (sqlite3.Error, OSError):
+        return {}
+    return res
+
+
+def find_cluster(cluster: int) -> List[str]:
+    """schedds we submitted a live cluster with this id to"""
+    return sorted(s for s, cl in live_clusters().items() if cluster in cl)
+
+
+def forget(schedd: str, clusters: Iterable[int]) -> None:
+    """drop clusters on schedd we found have left the queue"""
+    if not LEDGER:
+        return
+    try:
+        with cache_db(LEDGER_FILE, SCHEMA) as conn:
+            conn.executemany(
+                "DELETE FROM submissions WHERE schedd = ? AND cluster = ?",
+                [(schedd, int(c)) for c in clusters],
+            )
+    except (sqlite3.Error, OSError):
+        pass
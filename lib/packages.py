@@ -26,7 +26,9 @@ def orig_env() -> None:
     """put saved environment back"""
     # pylint: disable-next=global-variable-not-assigned
     global SAVED_ENV
-    if SAVED_ENV:
+    # only touch os.environ if it changed, so calls from several
+    # submission threads at once don't race each other
+    if SAVED_ENV and os.environ != SAVED_ENV:
         os.environ.clear()
         os.environ.update(SAVED_ENV)
 
@@ -0,0 +1,197 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" on-disk cache of schedd classads, shared between jobsub processes """
+import atexit
+import contextlib
+import fcntl
+import json
+import os
+import os.path
+import sys
+import threading
+import time
+import traceback as tb
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import classad  # type: ignore
+
+from utils import get_cache_dir
+
+try:
+    # seconds a cached schedd list is used without looking at the collector
+    _SCHEDD_CACHE_TTL_ENV = os.getenv("JOBSUB_SCHEDD_CACHE_TTL", "300")
+    SCHEDD_CACHE_TTL = int(_SCHEDD_CACHE_TTL_ENV)
+    # seconds a stale list may still be used while it is refreshed
+    _SCHEDD_CACHE_MAX_AGE_ENV = os.getenv("JOBSUB_SCHEDD_CACHE_MAX_AGE", "3600")
+    SCHEDD_CACHE_MAX_AGE = int(_SCHEDD_CACHE_MAX_AGE_ENV)
+except ValueError:
+    print(
+        "Schedd cache variables JOBSUB_SCHEDD_CACHE_TTL and "
+        "JOBSUB_SCHEDD_CACHE_MAX_AGE must be either unset or integers"
+    )
+    raise
+
+CACHE_FILE = "schedd_cache.json"
+
+# seconds we wait at exit for a background refresh to finish
+REFRESH_EXIT_WAIT = 10.0
+
+
+def cache_path() -> str:
+    """path of the schedd cache file"""
+    return os.path.join(get_cache_dir(), CACHE_FILE)
+
+
+@contextlib.contextmanager
+def _locked(exclusive: bool) -> Iterator[None]:
+    """hold a lock on the cache file for a read or read-modify-write"""
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    with open(f"{cache_path()}.lock", "a", encoding="UTF-8") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def _read() -> Dict[str, Any]:
+    """read the whole cache; caller must hold the lock"""
+    try:
+        with open(cache_path(), "r", encoding="UTF-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return data
+
+
+def _write(data: Dict[str, Any]) -> None:
+    """replace the cache file atomically; caller must hold the exclusive lock"""
+    tmpfile = f"{cache_path()}.{os.getpid()}"
+    with open(tmpfile, "w", encoding="UTF-8") as f:
+        json.dump(data, f)
+    os.replace(tmpfile, cache_path())
+
+
+def cache_key(collector: Optional[str], vargs: Dict[str, Any]) -> str:
+    """cache entries are per collector, dev/production split and group"""
+    dev = "dev" if vargs.get("devserver", "") else "prod"
+    return f"{collector}|{dev}|{vargs.get('group', '')}"
+
+
+def _schedd_name(ad: classad.ClassAd) -> str:
+    return str(ad.get("Machine", ad.get("Name", "")))
+
+
+def _downtimes(entry: Dict[str, Any]) -> Dict[str, bool]:
+    return dict(entry.get("downtime", {}))
+
+
+def lookup(key: str) -> Tuple[Optional[List[classad.ClassAd]], bool]:
+    """
+    return (schedd classads, stale) for key.  The ads are None if there is
+    no usable entry; stale is True if the entry is past its TTL and should
+    be refreshed.
+    """
+    if SCHEDD_CACHE_TTL <= 0:
+        return None, False
+    with _locked(False):
+        entry = _read().get(key, None)
+    if not entry:
+        return None, False
+    age = time.time() - entry.get("time", 0)
+    if age < 0 or age > max(SCHEDD_CACHE_MAX_AGE, SCHEDD_CACHE_TTL):
+        return None, False
+    try:
+        ads = [classad.parseOne(s) for s in entry.get("ads", [])]
+    except (SyntaxError, ValueError):
+        return None, False
+    return ads, age >= SCHEDD_CACHE_TTL
+
+
+def store(key: str, ads: List[classad.ClassAd], verbose: int = 0) -> None:
+    """
+    save ads as the entry for key.  If any schedd's InDownTime differs
+    from what we had cached, or a schedd has dropped out (the collector
+    query leaves out schedds in downtime), the other entries (for other
+    groups, etc.) may list that schedd too, so they are dropped as well.
+    An empty list is not saved, so the next lookup asks the collector again.
+    """
+    if SCHEDD_CACHE_TTL <= 0 or not ads:
+        return
+    downtime = {_schedd_name(ad): bool(ad.get("InDownTime", False)) for ad in ads}
+    with _locked(True):
+        data = _read()
+        old = _downtimes(data.get(key, {}))
+        changed = [n for n in old if old[n] != downtime.get(n, True)]
+        if changed:
+            if verbose > 0:
+                print(f"schedd downtime changed for {changed}, clearing schedd cache")
+            data = {}
+        data[key] = {
+            "time": time.time(),
+            "ads": [ad.printOld() for ad in ads],
+            "downtime": downtime,
+        }
+        _write(data)
+
+
+def invalidate(schedd_name: str) -> None:
+    """drop every cache entry listing schedd_name, e.g. after a failed submit"""
+    if SCHEDD_CACHE_TTL <= 0:
+        return
+    with _locked(True):
+        data = _read()
+        keep = {k: e for k, e in data.items() if schedd_name not in _downtimes(e)}
+        if len(keep) != len(data):
+            _write(keep)
+
+
+def refresh_in_background(
+    key: str, query: Callable[[], List[classad.ClassAd]], verbose: int = 0
+) -> Optional[threading.Thread]:
+    """
+    re-run query and store the result from a separate thread, so the
+    caller can go ahead with the stale entry.  Only one process refreshes
+    at a time; others just keep using the stale entry.
+    """
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    # pylint: disable-next=consider-using-with
+    lf = open(f"{cache_path()}.refresh", "a", encoding="UTF-8")
+    try:
+        fcntl.flock(lf, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lf.close()
+        return None
+
+    def _refresh() -> None:
+        try:
+            store(key, query(), verbose)
+        except Exception:  # pylint: disable=broad-except
+            if verbose > 0:
+                sys.stderr.write("Notice: background schedd cache refresh failed\n")
+                tb.print_exc()
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+            lf.close()
+
+    # a daemon thread, so a collector that never answers can't hang us at
+    # exit; but we do give it a while to finish if our caller is done first
+    t = threading.Thread(target=_refresh, name="schedd_cache_refresh", daemon=True)
+    t.start()
+    atexit.register(t.join, REFRESH_EXIT_WAIT)
+    return t
@@ -0,0 +1,97 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" local cache of tardir: uploads, by the manifest of the directory """
+import os
+import os.path
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from utils import cache_db, get_cache_dir, trim_lru
+
+# set JOBSUB_TARDIR_CACHE=0 to always tar up tardir: directories
+TARDIR_CACHE = os.getenv("JOBSUB_TARDIR_CACHE", "1") not in ("", "0")
+
+try:
+    # most directories we remember uploads of; the least recently used go first
+    _TARDIR_CACHE_SIZE_ENV = os.getenv("JOBSUB_TARDIR_CACHE_SIZE", "200")
+    TARDIR_CACHE_SIZE = int(_TARDIR_CACHE_SIZE_ENV)
+except ValueError:
+    print(
+        "Tardir cache variable JOBSUB_TARDIR_CACHE_SIZE must be either unset"
+        " or an integer"
+    )
+    raise
+
+TARDIR_CACHE_FILE = "tardirs.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tardirs (
+    manifest TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    dropbox TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    location TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (manifest, grp, dropbox)
+);
+"""
+
+
+def tardir_cache_path() -> str:
+    """path of the tardir cache database"""
+    return os.path.join(get_cache_dir(), TARDIR_CACHE_FILE)
+
+
+def lookup(manifest: str, group: str, dropbox: str) -> Optional[Tuple[str, str]]:
+    """
+    (tarball digest, dropbox location) of the upload for group to dropbox
+    (cvmfs or pnfs) of a directory with this manifest hash, if we made one
+    """
+    if not TARDIR_CACHE:
+        return None
+    try:
+        with cache_db(TARDIR_CACHE_FILE, SCHEMA) as conn:
+            row = conn.execute(
+                "SELECT digest, location FROM tardirs"
+                " WHERE manifest = ? AND grp = ? AND dropbox = ?",
+                (manifest, group, dropbox),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tardirs SET used = ?"
+                " WHERE manifest = ? AND grp = ? AND dropbox = ?",
+                (time.time(), manifest, group, dropbox),
+            )
+            return str(row[0]), str(row[1])
+    except (sqlite3.Error, OSError):
+        return None
+
+
+def store(manifest: str, group: str, dropbox: str, digest: str, location: str) -> None:
+    """remember an upload of a directory, dropping the least recently used"""
+    if not TARDIR_CACHE:
+        return
+    try:
+        with cache_db(TARDIR_CACHE_FILE, SCHEMA) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tardirs VALUES (?, ?, ?, ?, ?, ?)",
+                (manifest, group, dropbox, digest, location, time.time()),
+            )
+            trim_lru(conn, "tardirs", TARDIR_CACHE_SIZE)
+    except (sqlite3.Error, OSError):
+        pass
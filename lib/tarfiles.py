@@ -15,24 +15,42 @@
 # limitations under the License.
 """ tarfile upload related code """
 import argparse
+import collections
+import concurrent.futures
 import hashlib
 import itertools
 import os
 import os.path
 import random
 import re
+import stat
 import sys
 import tarfile as tarfile_mod
 import time
 import traceback as tb
-from typing import Union, Dict, Tuple, Callable, List, Any, Iterator, Optional
+import zlib
+from typing import (
+    IO,
+    Union,
+    Dict,
+    Tuple,
+    Callable,
+    List,
+    Any,
+    Iterator,
+    Optional,
+    cast,
+)
 from urllib.parse import quote as _quote
 import http.client
 import requests  # type: ignore
 from requests.auth import AuthBase  # type: ignore
 
+import digest_cache
 import fake_ifdh
 from creds import get_creds
+import tardir_cache
+import timings
 
 try:
     _NUM_RETRIES_ENV = os.getenv("JOBSUB_UPLOAD_NUM_RETRIES", "20")
@@ -46,6 +64,9 @@ except ValueError:
     )
     raise
 
+# how much of a tarball we read at once, hashing or uploading it
+CHUNK_SIZE = 1024 * 1024
+
 
 class TokenAuth(AuthBase):  # type: ignore
     # auth class for token authentication
@@ -62,18 +83,420 @@ class TokenAuth(AuthBase):  # type: ignore
         return r
 
 
-def tar_up(directory: str, excludes: str, file: str = ".") -> str:
-    """build directory.tar from path/to/directory"""
+# set JOBSUB_NATIVE_TAR=0 to make tarballs with the tar command
+NATIVE_TAR = os.getenv("JOBSUB_NATIVE_TAR", "1") not in ("", "0")
+
+
+# what --canonical-tar sets every mtime to: 2000-01-01, as tar warns
+# about timestamps of 0
+CANONICAL_MTIME = 946684800
+
+
+@timings.timed("tarfiles.tar_up")
+def tar_up(
+    directory: str, excludes: Optional[str], file: str = ".", canonical: bool = False
+) -> str:
+    """
+    build directory.tar from path/to/directory; canonical tarballs only
+    depend on the names, types and contents of the files, see
+    canonical_tarinfo()
+    """
     if not directory:
         directory = "."
     tarfile = os.path.basename(f"{directory}.tar.gz")
-    if not excludes:
-        excludes = os.path.dirname(__file__) + "/../etc/excludes"
-    excludes = f"--exclude-from {excludes} --exclude {tarfile}"
-    os.system(f"GZIP=-n tar czvf {tarfile} {excludes} --directory {directory} {file}")
+    if not NATIVE_TAR and not canonical:
+        excludes = f"--exclude-from {excludes_file(excludes)} --exclude {tarfile}"
+        os.system(
+            f"GZIP=-n tar czf {tarfile} {excludes} --directory {directory} {file}"
+        )
+        return tarfile
+    patterns = read_excludes(excludes_file(excludes)) + [tarfile]
+    write_tarball(
+        tarfile, directory, exclude_matcher(patterns), file, canonical=canonical
+    )
     return tarfile
 
 
+def canonical_tarinfo(ti: tarfile_mod.TarInfo) -> tarfile_mod.TarInfo:
+    """
+    ti with everything but the name, type, size and link target made the
+    same for everyone: a fixed mtime, root ownership, and permissions
+    0755 for directories and executables, 0644 for other files.
+    """
+    ti.mtime = CANONICAL_MTIME
+    ti.uid = ti.gid = 0
+    ti.uname = ti.gname = "root"
+    if ti.isdir() or (ti.isreg() and ti.mode & 0o111):
+        ti.mode = 0o755
+    elif ti.issym():
+        ti.mode = 0o777
+    else:
+        ti.mode = 0o644
+    ti.devmajor = ti.devminor = 0
+    return ti
+
+
+class ParallelGzipWriter:
+    """
+    write-only file that gzips what is written to it on several cores,
+    like pigz: the data is cut into blocks, each block deflated on its
+    own (primed with the 32k before it, so it compresses about as well
+    as one stream) in a thread pool, and the pieces written out in order
+    as one gzip member.  The output only depends on the data, the level,
+    the block size and the zlib build, not on the number of threads.
+    """
+
+    # zlib's largest window, the most of the previous block it can use
+    WINDOW = 32768
+
+    def __init__(
+        self,
+        fileobj: Any,
+        level: int = 6,
+        block_size: int = CHUNK_SIZE,
+        workers: Optional[int] = None,
+    ):
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self.pending: "collections.deque[concurrent.futures.Future[bytes]]" = (
+            collections.deque()
+        )
+        self.buf = bytearray()
+        self.tail = b""
+        self.crc = 0
+        self.size = 0
+        # gzip header: no name, mtime 0 (like gzip -n), unix
+        self.fileobj.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x03")
+
+    def _deflate(self, block: bytes, zdict: bytes) -> bytes:
+        if zdict:
+            c = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=zdict)
+        else:
+            c = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        # a sync flush ends the block on a byte boundary, not as the last
+        # one, so the next block's output can just follow it
+        return c.compress(block) + c.flush(zlib.Z_SYNC_FLUSH)
+
+    def _queue(self, block: bytes) -> None:
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        self.pending.append(self.pool.submit(self._deflate, block, self.tail))
+        self.tail = block[-self.WINDOW :]
+        # keep just enough blocks in flight to keep the threads busy
+        while len(self.pending) > 2 * self.workers:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data: bytes) -> int:
+        self.buf += data
+        while len(self.buf) >= self.block_size:
+            self._queue(bytes(self.buf[: self.block_size]))
+            del self.buf[: self.block_size]
+        return len(data)
+
+    def close(self) -> None:
+        if self.buf:
+            self._queue(bytes(self.buf))
+            self.buf = bytearray()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+        self.pool.shutdown()
+        # an empty last block ends the deflate stream
+        self.fileobj.write(zlib.compressobj(self.level, zlib.DEFLATED, -15).flush())
+        # gzip trailer: crc32 and size mod 2**32
+        self.fileobj.write(self.crc.to_bytes(4, "little"))
+        self.fileobj.write((self.size & 0xFFFFFFFF).to_bytes(4, "little"))
+
+    def abort(self) -> None:
+        """give up on the stream: drop the blocks not written yet, stop the pool"""
+        for fut in self.pending:
+            fut.cancel()
+        self.pending.clear()
+        self.pool.shutdown()
+
+
+class _HashingWriter:
+    """file that hashes what is written to it on the way to disk"""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, f: Any):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        return int(self.f.write(data))
+
+
+def write_tarball(
+    tarball: str,
+    directory: str,
+    excluded: Callable[[str], bool],
+    top: str = ".",
+    workers: Optional[int] = None,
+    canonical: bool = False,
+) -> str:
+    """
+    write a .tar.gz of top in directory to tarball, leaving out what
+    excluded says to, with the files in name order and compressed on
+    workers threads (with the same gzip settings every time), and with
+    canonical, the metadata normalized by canonical_tarinfo() and hard
+    links stored as separate files.  The tarball's digest is worked out as
+    it is written and put in the digest cache, so uploading it needn't
+    read it again; returns the digest.
+    """
+    fix = canonical_tarinfo if canonical else lambda ti: ti
+    entries = tree_entries(directory, excluded, top)
+    gz = None
+    done = False
+    try:
+        with open(tarball, "wb") as f:
+            out = _HashingWriter(f)
+            gz = ParallelGzipWriter(out, workers=workers)
+            # gz only has the write() and close() that "w|" streams use
+            with tarfile_mod.open(
+                fileobj=cast(IO[bytes], gz), mode="w|", format=tarfile_mod.GNU_FORMAT
+            ) as tf:
+                # undocumented, and so not in the type stubs
+                tf.copybufsize = CHUNK_SIZE  # type: ignore
+                if top == ".":
+                    tf.addfile(fix(tf.gettarinfo(directory, arcname=".")))
+                for name, kind, _, size, *_ in entries:
+                    ti = tf.gettarinfo(os.path.join(directory, name), arcname=name)
+                    if ti is None:
+                        # sockets and such
+                        continue
+                    if canonical and ti.islnk():
+                        # whether files are hard links depends on how they
+                        # were copied around, so each goes in as a file
+                        ti.type, ti.linkname, ti.size = tarfile_mod.REGTYPE, "", size
+                    ti = fix(ti)
+                    if kind == "f" and ti.isreg():
+                        with open(os.path.join(directory, name), "rb") as src:
+                            tf.addfile(ti, src)
+                    else:
+                        tf.addfile(ti)
+            gz.close()
+            done = True
+    finally:
+        if not done:
+            # don't leave the threads running, or half a tarball behind
+            if gz is not None:
+                gz.abort()
+            try:
+                os.unlink(tarball)
+            except OSError:
+                pass
+    digest = out.sha256.hexdigest()
+    digest_cache.store(digest_cache.file_key(tarball), digest)
+    return digest
+
+
+def excludes_file(excludes: Optional[str]) -> str:
+    """the exclusion file tar_up uses, given --tarball-exclusion-file"""
+    return excludes or os.path.dirname(__file__) + "/../etc/excludes"
+
+
+def read_excludes(excludes: str) -> List[str]:
+    """patterns from an exclusion file, one per line, as tar reads them"""
+    with open(excludes, "r", encoding="UTF-8", errors="surrogateescape") as f:
+        return [line.rstrip("\n") for line in f if line.rstrip("\n")]
+
+
+def _glob_regex(pattern: str) -> str:
+    """
+    regex for a tar exclude pattern: shell wildcards, where * matches /
+    too and a backslash quotes the next character
+    """
+    res = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            i += 1
+            res.append(re.escape(pattern[i]))
+        elif c == "*":
+            res.append(".*")
+        elif c == "?":
+            res.append(".")
+        elif c == "[" and "]" in pattern[i + 2 :]:
+            j = pattern.index("]", i + 2)
+            body = pattern[i + 1 : j]
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            res.append(f"[{body}]")
+            i = j
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return "".join(res)
+
+
+def exclude_matcher(patterns: List[str]) -> Callable[[str], bool]:
+    """
+    test for member names tar would leave out for patterns; like tar,
+    a pattern may match the whole name or any part after a slash
+    """
+    if not patterns:
+        return lambda name: False
+    rx = re.compile("|".join(f"(?:{_glob_regex(p)})" for p in patterns), re.S)
+
+    def excluded(name: str) -> bool:
+        parts = name.split("/")
+        return any(
+            rx.fullmatch("/".join(parts[i:])) for i in range(len(parts)) if parts[i]
+        )
+
+    return excluded
+
+
+# manifest entry: name, kind, mode, size, mtime_ns, symlink target
+ManifestEntry = Tuple[str, str, int, int, int, str]
+
+
+def _entry(path: str, member: str, st: os.stat_result) -> ManifestEntry:
+    """the manifest entry for path, named member in the tarball"""
+    if stat.S_ISLNK(st.st_mode):
+        kind, link = "l", os.readlink(path)
+    elif stat.S_ISDIR(st.st_mode):
+        kind, link = "d", ""
+    else:
+        kind, link = "f", ""
+    return (member, kind, st.st_mode, st.st_size, st.st_mtime_ns, link)
+
+
+def _scan_dir(path: str, name: str) -> List[ManifestEntry]:
+    """manifest entries for the contents of one directory"""
+    with os.scandir(path) as it:
+        return [
+            _entry(de.path, f"{name}/{de.name}", de.stat(follow_symlinks=False))
+            for de in it
+        ]
+
+
+def tree_entries(
+    directory: str,
+    excluded: Callable[[str], bool],
+    top: str = ".",
+    workers: int = 8,
+) -> List[ManifestEntry]:
+    """
+    manifest entries for everything tar_up would put in a tarball of top
+    (a file or directory) in directory, with member names like
+    ./sub/file, sorted; directories are read in parallel.  The "." top
+    directory itself is left out.
+    """
+    res: List[ManifestEntry] = []
+    root = directory if top == "." else os.path.join(directory, top)
+    if top != ".":
+        if excluded(top):
+            return res
+        res.append(_entry(root, top, os.lstat(root)))
+        if res[0][1] != "d":
+            return res
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, root, top): root}
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for fut in done:
+                path = pending.pop(fut)
+                for e in fut.result():
+                    if excluded(e[0]):
+                        continue
+                    res.append(e)
+                    if e[1] == "d":
+                        sub = os.path.join(path, os.path.basename(e[0]))
+                        pending[pool.submit(_scan_dir, sub, e[0])] = sub
+    res.sort()
+    return res
+
+
+@timings.timed("tarfiles.tree_manifest")
+def tree_manifest(
+    directory: str, excludes: Optional[str], canonical: bool = False
+) -> str:
+    """
+    hash of what tar_up(directory, excludes, canonical=canonical) would
+    tar up: names, types, modes, sizes and mtimes after the exclusions, so
+    an unchanged tree has the same manifest hash and needn't be tarred
+    again
+    """
+    if not directory:
+        directory = "."
+    excludes = excludes_file(excludes)
+    patterns = read_excludes(excludes) + [os.path.basename(f"{directory}.tar.gz")]
+    h = hashlib.sha256()
+    h.update(f"{os.path.abspath(directory)}\0".encode())
+    h.update("\0".join(patterns).encode("UTF-8", "surrogateescape") + b"\n")
+    if canonical:
+        h.update(b"canonical\n")
+    for e in tree_entries(directory, exclude_matcher(patterns)):
+        line = "\0".join(str(x) for x in e) + "\n"
+        h.update(line.encode("UTF-8", "surrogateescape"))
+    return h.hexdigest()
+
+
+@timings.timed("tarfiles.hash_file")
+def hash_file(fname: str) -> str:
+    """sha256 digest of a file, read a chunk at a time"""
+    h = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(fname: str) -> str:
+    """
+    sha256 digest of a file, remembered (see digest_cache) so the same
+    unchanged tarball is only read once, across submissions too
+    """
+    return digest_cache.cached_digest(fname, hash_file)
+
+
+class HashingReader:
+    """
+    file-like view of a tarball for requests to upload from a piece at a
+    time, hashing the bytes as they go out; so an upload takes the same
+    memory however big the tarball is, and tells us what it sent.
+    """
+
+    def __init__(self, fname: str):
+        # pylint: disable-next=consider-using-with
+        self.f = open(fname, "rb")
+        self.size = os.fstat(self.f.fileno()).st_size
+        self.sha256 = hashlib.sha256()
+
+    def __len__(self) -> int:
+        # so requests sends a Content-Length rather than chunking
+        return self.size
+
+    def read(self, n: int = CHUNK_SIZE) -> bytes:
+        if n is None or n < 0:
+            n = CHUNK_SIZE
+        data = self.f.read(n)
+        self.sha256.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+    def close(self) -> None:
+        self.f.close()
+
+    def __enter__(self) -> "HashingReader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+@timings.timed("tarfiles.slurp_file")
 def slurp_file(fname: str) -> Tuple[str, bytes]:
     """pull in a tarfile while computing its hash"""
     h = hashlib.sha256()
@@ -89,12 +512,12 @@ def slurp_file(fname: str) -> Tuple[str, bytes]:
     return h.hexdigest(), bytes().join(tfl)
 
 
+@timings.timed("tarfiles.dcache_persistent_path")
 def dcache_persistent_path(exp: str, filename: str) -> str:
     """pick the reslient dcache path for a tarfile"""
     bf = os.path.basename(filename)
 
-    with os.popen(f"sha256sum {filename}", "r") as f:
-        sha256_hash = f.read().strip().split(" ")[0]
+    sha256_hash = file_digest(filename)
 
     # gm2 has upper cased the experiment name in DCache for some reason...
     if exp == "gm2":
@@ -140,7 +563,10 @@ def do_tarballs(args: argparse.Namespace) -> None:
 
             if args.use_dropbox == "cvmfs" or args.use_dropbox is None:
                 tarfile = tar_up(
-                    os.path.dirname(pfn), "/dev/null", os.path.basename(pfn)
+                    os.path.dirname(pfn),
+                    "/dev/null",
+                    os.path.basename(pfn),
+                    canonical=args.canonical_tar,
                 )
                 clean_up.append(tarfile)
                 path = tarfile_in_dropbox(args, tarfile)
@@ -176,9 +602,21 @@ def do_tarballs(args: argparse.Namespace) -> None:
         if tfn.startswith("tardir://"):
             tfn = tfn.replace("//", "", 1)
 
+        manifest = None
         if tfn.startswith("tardir:"):
+            # if we already uploaded a tarball of the directory as it is
+            # now, and it's still there, use that
+            manifest = tree_manifest(
+                tfn[7:], args.tarball_exclusion_file, args.canonical_tar
+            )
+            path = tardir_in_dropbox(args, manifest)
+            if path:
+                res.append(path)
+                continue
             # tar it up, pretend they gave us dropbox:
-            tarfile = tar_up(tfn[7:], args.tarball_exclusion_file)
+            tarfile = tar_up(
+                tfn[7:], args.tarball_exclusion_file, canonical=args.canonical_tar
+            )
             tfn = f"dropbox:{tarfile}"
             clean_up.append(tarfile)
 
@@ -188,6 +626,14 @@ def do_tarballs(args: argparse.Namespace) -> None:
                 tfn = tfn.replace("//", "", 1)
             path = tarfile_in_dropbox(args, tfn[8:])
             if path:
+                if manifest:
+                    tardir_cache.store(
+                        manifest,
+                        args.group,
+                        args.use_dropbox or "cvmfs",
+                        file_digest(tfn[8:]),
+                        path,
+                    )
                 tfn = path
             else:
                 tfn = tfn.replace("dropbox:", "", 1)
@@ -204,6 +650,31 @@ def do_tarballs(args: argparse.Namespace) -> None:
             print(f"Notice: unable to remove generated tarfile {tarfile}")
 
 
+def tardir_in_dropbox(args: argparse.Namespace, manifest: str) -> Optional[str]:
+    """
+    where the tarball we made earlier of a directory with this manifest
+    hash is in the dropbox, if it is still there
+    """
+    dropbox = args.use_dropbox or "cvmfs"
+    known = tardir_cache.lookup(manifest, args.group, dropbox)
+    if known is None:
+        return None
+    digest, location = known
+    if dropbox == "cvmfs":
+        proxy, token = get_creds(vars(args))
+        publisher = TarfilePublisherHandler(f"{args.group}/{digest}", proxy, token)
+        location = publisher.cid_exists()
+        if location is None:
+            return None
+        # tag it so it stays around
+        publisher.update_cid()
+    elif not fake_ifdh.ls(location):
+        return None
+    if args.verbose:
+        print(f"directory unchanged since it was uploaded to {location}")
+    return location
+
+
 def tarfile_in_dropbox(args: argparse.Namespace, tfn: str) -> Optional[str]:
     """
     upload a tarfile to the dropbox, return its path there
@@ -215,7 +686,7 @@ def tarfile_in_dropbox(args: argparse.Namespace, tfn: str) -> Optional[str]:
 
     location: Optional[str] = ""
     if args.use_dropbox == "cvmfs" or args.use_dropbox is None:
-        digest, tf = slurp_file(tfn)
+        digest = file_digest(tfn)
         proxy, token = get_creds(vars(args))
 
         if not args.group:
@@ -229,7 +700,9 @@ def tarfile_in_dropbox(args: argparse.Namespace, tfn: str) -> Optional[str]:
         publisher = TarfilePublisherHandler(cid, proxy, token)
         location = publisher.cid_exists()
         if location is None:
-            publisher.publish(tf)
+            publisher.publish(tfn)
+            if publisher.sent_digest not in (None, digest):
+                raise RuntimeError(f"tarball {tfn} changed while we uploaded it")
             print("Checking to see if uploaded file is published on RCDS.")
             # pylint: disable-next=unused-variable
             for i in range(NUM_RETRIES):
@@ -291,6 +764,8 @@ class TarfilePublisherHandler:
             f"https://{{dropbox_server}}/pubapi/{{endpoint}}?cid={self.cid_url}"
         )
         self.pubapi_base_url_formatter = self.pubapi_base_url_formatter_full
+        # sha256 of what the last publish() from a file sent
+        self.sent_digest: Optional[str] = None
 
     # pylint: disable-next=no-self-argument
     def pubapi_operation(func: Callable) -> Callable:  # type: ignore
@@ -337,6 +812,7 @@ class TarfilePublisherHandler:
 
         return wrapper
 
+    @timings.timed("pubapi.update_cid")
     @pubapi_operation
     def update_cid(self) -> requests.Response:
         """Make PubAPI update call to check if we already have this tarfile
@@ -350,22 +826,34 @@ class TarfilePublisherHandler:
             return requests.get(url, auth=TokenAuth(self.token))
         return requests.get(url, cert=(self.proxy, self.proxy))
 
+    @timings.timed("pubapi.publish")
     @pubapi_operation
-    def publish(self, tarfile: str) -> requests.Response:
+    def publish(self, tarfile: Union[str, bytes]) -> requests.Response:
         """Make PubAPI publish call to upload this tarfile
 
         Args:
-            tarfile (bytes): Byte-string of tarfile #TODO CHECK THIS
+            tarfile (str or bytes): Path of the tarfile, which is streamed
+            from disk (and hashed on the way, see self.sent_digest), or its
+            contents
 
         Returns:
             requests.Response: Response from PubAPI call indicating if tarball
             represented by self.cid is present
         """
         url = self.pubapi_base_url_formatter.format(endpoint="publish")
+        if isinstance(tarfile, bytes):
+            return self._post(url, tarfile)
+        with HashingReader(tarfile) as reader:
+            res = self._post(url, reader)
+            self.sent_digest = reader.hexdigest()
+        return res
+
+    def _post(self, url: str, data: Any) -> requests.Response:
         if self.token:
-            return requests.post(url, auth=TokenAuth(self.token), data=tarfile)
-        return requests.post(url, cert=(self.proxy, self.proxy), data=tarfile)
+            return requests.post(url, auth=TokenAuth(self.token), data=data)
+        return requests.post(url, cert=(self.proxy, self.proxy), data=data)
 
+    @timings.timed("pubapi.cid_exists")
     @pubapi_operation
     def cid_exists(self) -> requests.Response:
         """Make PubAPI update call to check if we already have this tarfile
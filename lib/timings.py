@@ -0,0 +1,113 @@
+#
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" wall clock and subprocess time spent in each phase of a command """
+import contextlib
+import functools
+import json
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_lock = threading.Lock()
+
+# phase name -> {"calls": n, "wall": seconds, "subprocess": seconds}, in
+# the order the phases first started
+_phases: Dict[str, Dict[str, float]] = {}
+
+_start = time.time()
+
+
+def _children_cpu() -> float:
+    """cpu time used so far by our finished subprocesses"""
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    count the time spent in the with block against phase name.  Phases
+    may nest, and run in several threads at once; subprocess time is the
+    cpu time of the subprocesses that finished meanwhile (in any thread).
+    """
+    with _lock:
+        _phases.setdefault(name, {"calls": 0, "wall": 0.0, "subprocess": 0.0})
+    t0 = time.perf_counter()
+    c0 = _children_cpu()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = _children_cpu() - c0
+        with _lock:
+            p = _phases[name]
+            p["calls"] += 1
+            p["wall"] += wall
+            p["subprocess"] += cpu
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """decorator to time every call of a function as phase name"""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def reset() -> None:
+    """forget the phases timed so far"""
+    global _start  # pylint: disable=global-statement
+    with _lock:
+        _phases.clear()
+        _start = time.time()
+
+
+def get_timings() -> Dict[str, Any]:
+    """the timings so far, as something json.dump can write"""
+    with _lock:
+        return {
+            "total": time.time() - _start,
+            "phases": {k: dict(v) for k, v in _phases.items()},
+        }
+
+
+def report() -> List[str]:
+    """the timings so far as a table, one line per phase"""
+    t = get_timings()
+    res = [f"{'PHASE':<28s} {'CALLS':>6s} {'WALL':>9s} {'SUBPROC':>9s} {'%':>5s}"]
+    for name, p in t["phases"].items():
+        share = 100.0 * p["wall"] / t["total"] if t["total"] else 0.0
+        res.append(
+            f"{name:<28.28s} {int(p['calls']):6d} {p['wall']:9.3f}"
+            f" {p['subprocess']:9.3f} {share:5.1f}"
+        )
+    res.append(f"{'total':<28s} {'':6s} {t['total']:9.3f}")
+    return res
+
+
+def write_json(filename: str) -> None:
+    """write the timings so far to filename as JSON"""
+    with open(filename, "w", encoding="UTF-8") as f:
+        json.dump(get_timings(), f, indent=2)
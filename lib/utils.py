@@ -15,20 +15,59 @@
 # limitations under the License.
 """ misc. utility functions """
 from collections import OrderedDict
+import contextlib
 import datetime
 import os
 import os.path
 import re
 import socket
+import sqlite3
 import sys
 import subprocess
 import uuid
 import shutil
 import time
-from typing import Union, Dict, Any, NamedTuple, Tuple, List
+from typing import Union, Dict, Any, Iterator, NamedTuple, Tuple, List
 
 ONSITE_SITE_NAME = "Fermigrid"
 DEFAULT_USAGE_MODELS = ["DEDICATED", "OPPORTUNISTIC", "OFFSITE"]
+# names of the condor.SCHEDD_SELECTORS policies for picking a schedd
+SCHEDD_SELECTION_POLICIES = ["random", "weighted", "p2c"]
+
+
+def get_cache_dir() -> str:
+    """per-user jobsub_lite cache area, also where submit directories go"""
+    return (
+        os.environ.get("XDG_CACHE_HOME", f"{os.environ.get('HOME')}/.cache")
+        + "/jobsub_lite"
+    )
+
+
+@contextlib.contextmanager
+def cache_db(filename: str, schema: str) -> Iterator[sqlite3.Connection]:
+    """
+    connection to the sqlite database filename in the cache area, with
+    the tables in schema made if need be; committed (or rolled back) and
+    closed after
+    """
+    os.makedirs(get_cache_dir(), exist_ok=True)
+    # several jobsub commands may write at once; wait for each other
+    conn = sqlite3.connect(os.path.join(get_cache_dir(), filename), timeout=30)
+    try:
+        with conn:
+            conn.executescript(schema)
+            yield conn
+    finally:
+        conn.close()
+
+
+def trim_lru(conn: sqlite3.Connection, table: str, size: int) -> None:
+    """drop all but the size most recently used rows of a cache_db table"""
+    conn.execute(
+        f"DELETE FROM {table} WHERE rowid NOT IN"
+        f" (SELECT rowid FROM {table} ORDER BY used DESC LIMIT ?)",
+        (size,),
+    )
 
 
 def cleandir(d: str) -> None:
@@ -102,22 +141,24 @@ def set_extras_n_fix_units(
     if args["verbose"] > 1:
         sys.stderr.write(f"entering set_extras... args: {repr(args)}\n")
 
-    args["outbase"] = (
-        os.environ.get("XDG_CACHE_HOME", f"{os.environ.get('HOME')}/.cache")
-        + "/jobsub_lite"
-    )
+    args["outbase"] = get_cache_dir()
     args["user"] = os.environ["USER"]
     args["schedd"] = schedd_name
-    ai = socket.getaddrinfo(socket.gethostname(), 80)
-    args["clientdn"] = get_client_dn(proxy)
-    if ai:
-        args["ipaddr"] = ai[-1][-1][0]
-    else:
-        args["ipaddr"] = "unknown"
+    # these are the same for every submission with the same credentials,
+    # so dagnabbit stages and batch submissions pass them in already set
+    if not "clientdn" in args:
+        args["clientdn"] = get_client_dn(proxy)
+    if not "ipaddr" in args:
+        ai = socket.getaddrinfo(socket.gethostname(), 80)
+        if ai:
+            args["ipaddr"] = ai[-1][-1][0]
+        else:
+            args["ipaddr"] = "unknown"
     args["proxy"] = proxy
     args["token"] = token
     args["jobsub_version"] = "lite_v1_0"
-    args["kerberos_principal"] = get_principal()
+    if not "kerberos_principal" in args:
+        args["kerberos_principal"] = get_principal()
     args["uid"] = str(os.getuid())
 
     if not "uuid" in args:
@@ -201,6 +242,10 @@ def set_extras_n_fix_units(
             args["postscript"] = dest
             os.chmod(dest, 0o755)
 
+    args["queue_vars"], args["queue_items"] = get_queue_items(
+        args.get("queue_from", None), args.get("arg_matrix", [])
+    )
+
     # Sanitize --lines input.  There's the unfortunate possibility of "--lines '""'" being passed
     # in, so guard against those kinds of things
     if args.get("lines"):
@@ -260,6 +305,71 @@ def set_extras_n_fix_units(
     args["jobsub_command"] = " ".join(sys.argv)
 
 
+# submit macros condor defines itself for queue statements
+RESERVED_QUEUE_VARS = {"cluster", "process", "step", "item", "itemindex", "row", "node"}
+
+
+def get_queue_items(
+    queue_from: Union[None, str], arg_matrix: List[str]
+) -> Tuple[List[str], List[str]]:
+    """
+    build condor "queue ... from" item data out of --queue-from and
+    --arg-matrix: return the variable names and one item line per job,
+    every combination of the --queue-from lines and --arg-matrix values.
+    """
+    qvars: List[str] = []
+    rows: List[List[str]] = [[]]
+    if queue_from:
+        with open(queue_from, "r", encoding="UTF-8") as f:
+            lines = [l.strip() for l in f if l.strip() and not l.startswith("#")]
+        if not lines:
+            raise SystemExit(f"--queue-from file {queue_from} is empty")
+        qvars = re.split(r"[\s,]+", lines[0])
+        # like condor, the last variable gets the rest of the line
+        rows = [
+            [v.strip() for v in re.split(r"\s*[\s,]\s*", l, len(qvars) - 1)]
+            for l in lines[1:]
+        ]
+        for row in rows:
+            if len(row) != len(qvars):
+                raise SystemExit(
+                    f"--queue-from file {queue_from}: '{' '.join(row)}' needs"
+                    f" values for {','.join(qvars)}"
+                )
+    for m in arg_matrix:
+        name, _, values = m.partition("=")
+        if not values:
+            raise SystemExit(f"--arg-matrix {m} should be NAME=VALUE1,VALUE2,...")
+        qvars.append(name.strip())
+        rows = [r + [v.strip()] for r in rows for v in values.split(",")]
+
+    for i, v in enumerate(qvars):
+        if not re.fullmatch("[A-Za-z_][A-Za-z0-9_]*", v) or v.lower() in (
+            RESERVED_QUEUE_VARS
+        ):
+            raise SystemExit(
+                f"'{v}' can not be used as a --queue-from/--arg-matrix name"
+            )
+        if qvars.index(v) != i:
+            raise SystemExit(f"--queue-from/--arg-matrix name '{v}' given twice")
+    for row in rows:
+        for i, val in enumerate(row):
+            # values go in the job environment, and all but the last
+            # one are split on commas and spaces in the item data
+            if re.search('[;"\n]', val) or (
+                i < len(row) - 1 and re.search(r"[\s,]", val)
+            ):
+                raise SystemExit(
+                    f"--queue-from/--arg-matrix value '{val}' for {qvars[i]} can not be used"
+                )
+
+    if not qvars:
+        return [], []
+    if not rows:
+        raise SystemExit(f"--queue-from file {queue_from} has no lines to queue")
+    return qvars, [",".join(row) for row in rows]
+
+
 # pylint: disable-next=too-many-arguments
 def fix_unit(
     args: Dict[str, Any],
@@ -0,0 +1,120 @@
+#!/usr/bin/python3 -I
+
+#
+# publish_bench.py -- time and size up tarball uploads to a stand-in PubAPI
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+    upload a scratch tarball of --size-mb megabytes to a local stand-in
+    for the PubAPI publish endpoint, either the old way (slurp_file the
+    whole tarball, post the bytes) or streamed from disk, and report the
+    time taken and the peak memory of the process doing it.  Each way
+    runs in its own process, so their peak memory is their own.
+"""
+# pylint: disable=wrong-import-position,wrong-import-order,import-error
+
+import argparse
+import hashlib
+import http.server
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PREFIX = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PREFIX, "lib"))
+
+import tarfiles
+
+
+class PubAPIStandIn(http.server.BaseHTTPRequestHandler):
+    """just enough of PubAPI: publish reads and hashes the upload"""
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        h = hashlib.sha256()
+        left = int(self.headers.get("Content-Length", 0))
+        while left > 0:
+            data = self.rfile.read(min(left, tarfiles.CHUNK_SIZE))
+            if not data:
+                break
+            h.update(data)
+            left -= len(data)
+        body = f"OK {h.hexdigest()}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:  # type: ignore
+        pass
+
+
+def run_one(mode: str, tarball: str) -> None:
+    """upload tarball mode's way, print mode, seconds and peak RSS in MB"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PubAPIStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    publisher = tarfiles.TarfilePublisherHandler("bench/cid", None, None)
+    publisher.dropbox_servers = (f"127.0.0.1:{server.server_address[1]}",)
+    publisher.pubapi_base_url_formatter_full = (
+        publisher.pubapi_base_url_formatter_full.replace("https:", "http:")
+    )
+
+    t0 = time.perf_counter()
+    if mode == "slurp":
+        _, tf = tarfiles.slurp_file(tarball)
+        publisher.publish(tf)
+    else:
+        tarfiles.hash_file(tarball)
+        publisher.publish(tarball)
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    # ru_maxrss is in kilobytes on linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(f"{mode:<8s} {elapsed:8.2f}s {peak:10.1f}MB")
+
+
+def main() -> None:
+    """make the tarball, run each mode in a child process"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--mode", choices=["slurp", "stream", "both"], default="both")
+    parser.add_argument("--tarball", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.tarball:
+        run_one(args.mode, args.tarball)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tarball = os.path.join(tmp, "bench.tar.gz")
+        with open(tarball, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        print(f"{'MODE':<8s} {'TIME':>9s} {'PEAK RSS':>12s}  ({args.size_mb}MB)")
+        modes = ["slurp", "stream"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--tarball", tarball],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python3 -I
+
+#
+# schedd_select_sim.py -- compare schedd selection policies on synthetic ads
+# COPYRIGHT 2023 FERMI NATIONAL ACCELERATOR LABORATORY
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+    simulate a campaign of submissions against a pool of synthetic
+    schedd ads, and report how each condor.SCHEDD_SELECTORS policy
+    spreads the load.  Like jobsub_submit, the policies only see schedd
+    ads as fresh as the schedd cache refresh interval.
+"""
+# pylint: disable=wrong-import-position,wrong-import-order,import-error
+
+import argparse
+import os
+import random
+import statistics
+import sys
+from typing import Any, Dict, List
+
+PREFIX = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PREFIX, "lib"))
+
+import classad  # type: ignore
+import condor
+
+
+def make_pool(nschedds: int, seed: int) -> List[Dict[str, Any]]:
+    """synthetic schedds, deliberately unevenly loaded to start with"""
+    rng = random.Random(seed)
+    pool: List[Dict[str, Any]] = []
+    for i in range(nschedds):
+        running = rng.randint(0, 20000)
+        pool.append(
+            {
+                "Name": f"jobsub{i:02d}.example.com",
+                "TotalIdleJobs": float(rng.randint(0, 30000)),
+                "TotalRunningJobs": float(running),
+                "NumUsers": float(rng.randint(1, 60)),
+                "RecentDaemonCoreDutyCycle": min(0.99, running / 25000.0),
+            }
+        )
+    return pool
+
+
+def to_ads(pool: List[Dict[str, Any]]) -> List[classad.ClassAd]:
+    return [classad.ClassAd(dict(s)) for s in pool]
+
+
+def simulate(policy: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """run args.submissions submissions with policy, return the final pool"""
+    random.seed(args.seed)
+    pool = make_pool(args.schedds, args.seed)
+    ads = to_ads(pool)
+    select = condor.SCHEDD_SELECTORS[policy]
+    for n in range(args.submissions):
+        if n % args.refresh == 0:
+            # the schedd cache gets fresh ads now and then
+            ads = to_ads(pool)
+        name = select(ads)["Name"]
+        for s in pool:
+            # every schedd starts some idle jobs each round
+            started = min(s["TotalIdleJobs"], args.drain)
+            s["TotalIdleJobs"] -= started
+            s["TotalRunningJobs"] = max(
+                0.0, s["TotalRunningJobs"] + started - args.drain
+            )
+            if s["Name"] == name:
+                s["TotalIdleJobs"] += args.cluster_size
+            queued = s["TotalIdleJobs"] + s["TotalRunningJobs"]
+            s["RecentDaemonCoreDutyCycle"] = min(0.99, queued / 50000.0)
+    return pool
+
+
+def report(policy: str, pool: List[Dict[str, Any]]) -> None:
+    idle = [s["TotalIdleJobs"] for s in pool]
+    duty = [s["RecentDaemonCoreDutyCycle"] for s in pool]
+    print(
+        f"{policy:10s} idle max {max(idle):9.0f} mean {statistics.mean(idle):9.0f}"
+        f" stdev {statistics.pstdev(idle):9.0f}"
+        f"   duty cycle max {max(duty):5.2f} mean {statistics.mean(duty):5.2f}"
+    )
+
+
+def main() -> None:
+    """parse args, run each policy, print a comparison"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--schedds", type=int, default=8, help="number of schedds")
+    parser.add_argument(
+        "--submissions", type=int, default=2000, help="number of submissions"
+    )
+    parser.add_argument(
+        "--cluster-size", type=float, default=500, help="jobs per submission"
+    )
+    parser.add_argument(
+        "--drain", type=float, default=60, help="jobs each schedd starts per round"
+    )
+    parser.add_argument(
+        "--refresh",
+        type=int,
+        default=20,
+        help="submissions between schedd ad refreshes (cache TTL)",
+    )
+    parser.add_argument("--seed", type=int, default=12345, help="random seed")
+    parser.add_argument("policies", nargs="*", default=sorted(condor.SCHEDD_SELECTORS))
+    args = parser.parse_args()
+
+    report("initial", make_pool(args.schedds, args.seed))
+    for policy in args.policies:
+        report(policy, simulate(policy, args))
+
+
+if __name__ == "__main__":
+    main()
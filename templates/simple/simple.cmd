@@ -10,10 +10,16 @@ error              = {{filebase}}.err
 log                = {{filebase}}.log
 
 {%if not (( dag is defined and dag ) or (dataset_definition is defined and dataset_definition)) %}
+{%if spread_schedds is defined and spread_schedds and spread_schedds|int > 1 %}
+# numbered across the clusters on all the schedds, see --spread-schedds
+JOBSUB_SECTION_EXPR = $(JOBSUB_PROC_OFFSET) + $(Process)
+JOBSUBJOBSECTION=$INT(JOBSUB_SECTION_EXPR)
+{%else%}
 JOBSUBJOBSECTION=$(Process)
 {%endif%}
+{%endif%}
 
-environment        = CLUSTER=$(Cluster);PROCESS=$(Process);JOBSUBJOBSECTION=$(JOBSUBJOBSECTION);CONDOR_TMP={{outdir}};BEARER_TOKEN_FILE=.condor_creds/{{group}}.use;CONDOR_EXEC=/tmp;DAGMANJOBID=$(DAGManJobId);GRID_USER={{user}};JOBSUBJOBID=$(CLUSTER).$(PROCESS)@{{schedd}};EXPERIMENT={{group}};{{environment|join(';')}}
+environment        = {%for v in queue_vars|default([])%}{{v}}=$({{v}});{%endfor%}CLUSTER=$(Cluster);PROCESS=$(Process);JOBSUBJOBSECTION=$(JOBSUBJOBSECTION);CONDOR_TMP={{outdir}};BEARER_TOKEN_FILE=.condor_creds/{{group}}.use;CONDOR_EXEC=/tmp;DAGMANJOBID=$(DAGManJobId);GRID_USER={{user}};JOBSUBJOBID=$(CLUSTER).$(PROCESS)@{{schedd}};EXPERIMENT={{group}};{{environment|join(';')}}
 rank               = Mips / 2 + Memory
 job_lease_duration = 3600
 notification       = Never
@@ -96,4 +102,13 @@ use_oauth_services = {{group}}
 delegate_job_GSI_credentials_lifetime = 0
 {% endif %}
 
+{% if max_materialize is defined and max_materialize %}
+max_materialize = {{max_materialize}}
+{% endif %}
+{% if queue_items is defined and queue_items %}
+queue {{N}} {{queue_vars|join(",")}} from (
+{{queue_items|join("\n")}}
+)
+{% else %}
 queue {{N}}
+{% endif %}
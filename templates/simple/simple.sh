@@ -350,6 +350,12 @@ mkdir $JOBSUB_OUT_{{pair[0]}}
 {%endif%}
 # ==========
 
+{% if queue_vars is defined and queue_vars %}
+# per-job values from --queue-from / --arg-matrix are in our environment
+export JOBSUB_QUEUE_VARS="{{queue_vars|join(' ')}}"
+echo `date` $JOBSUBJOBID queue item:{%for v in queue_vars%} {{v}}=${{v}}{%endfor%}
+
+{% endif %}
 
 export JOBSUB_EXE_SCRIPT=$(ls {{executable|basename}} 2>/dev/null)
 if [ "$JOBSUB_EXE_SCRIPT" = "" ]; then
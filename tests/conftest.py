@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture
+def cache_home(tmp_path, monkeypatch):
+    """a scratch $XDG_CACHE_HOME, so the jobsub_lite caches start empty"""
+    home = tmp_path / "cache"
+    home.mkdir()
+    monkeypatch.setenv("XDG_CACHE_HOME", str(home))
+    return home
@@ -126,6 +126,99 @@ class TestCondorUnit:
         print("schedd name: {0}".format(schedd["Name"]))
         assert schedd["Name"] == TestUnit.test_schedd
 
+    @pytest.mark.unit
+    def test_get_schedd_none_1(self, monkeypatch):
+        """no eligible schedds is a clear error"""
+        monkeypatch.setattr(condor, "get_schedd_list", lambda vargs: [])
+        with pytest.raises(Exception, match="no eligible schedds"):
+            condor.get_schedd({"group": "fermilab"})
+
+    @pytest.mark.unit
+    def test_schedd_constraint_1(self):
+        """make sure the collector constraint picks the right schedds"""
+        import classad
+
+        vargs = dict(TestUnit.test_vargs)
+        vargs["group"] = "g-2"
+        expr = classad.ExprTree(condor.schedd_constraint(vargs))
+        good = {
+            "Machine": "jobsubdev01.example.com",
+            "IsJobsubLite": True,
+            "SupportedVOList": "dune,g-2",
+        }
+        assert expr.eval(classad.ClassAd(good)) == True
+        for bad in [
+            {"Machine": "jobsub01.example.com"},
+            {"IsJobsubLite": False},
+            {"SupportedVOList": "dune"},
+            {"InDownTime": True},
+        ]:
+            ad = dict(good)
+            ad.update(bad)
+            assert expr.eval(classad.ClassAd(ad)) == False
+
+    @pytest.mark.unit
+    def test_schedd_selectors_1(self):
+        """load aware policies should avoid a badly overloaded schedd"""
+        import classad
+
+        busy = classad.ClassAd(
+            {"Name": "busy", "TotalIdleJobs": 50000, "RecentDaemonCoreDutyCycle": 0.98}
+        )
+        idle = classad.ClassAd({"Name": "idle", "TotalIdleJobs": 10})
+        assert condor.schedd_load(busy) > condor.schedd_load(idle)
+        assert condor.schedd_load(classad.ClassAd()) == 0.0
+        for policy in ["weighted", "p2c"]:
+            picks = [
+                condor.SCHEDD_SELECTORS[policy]([busy, idle])["Name"] for i in range(50)
+            ]
+            assert picks.count("idle") > 45
+        assert condor.SCHEDD_SELECTORS["random"]([idle])["Name"] == "idle"
+
+    @pytest.mark.unit
+    def test_schedd_selection_env_1(self, monkeypatch):
+        """a bad $JOBSUB_SCHEDD_SELECTION is an error when we pick a schedd"""
+        import classad
+        import utils
+
+        assert list(condor.SCHEDD_SELECTORS) == utils.SCHEDD_SELECTION_POLICIES
+        ads = [classad.ClassAd({"Name": "s0", "Machine": "s0"})]
+        monkeypatch.setattr(condor, "get_schedd_list", lambda vargs: list(ads))
+        monkeypatch.setattr(condor, "SCHEDD_SELECTION", "fastest")
+        with pytest.raises(ValueError, match="JOBSUB_SCHEDD_SELECTION"):
+            condor.get_schedd({})
+        assert condor.get_schedd({"schedd_selection": "p2c"})["Name"] == "s0"
+
+    @pytest.mark.unit
+    def test_get_schedds_1(self, monkeypatch):
+        """--spread-schedds gets different schedds, as many as there are"""
+        import classad
+
+        ads = [classad.ClassAd({"Name": f"s{i}", "Machine": f"s{i}"}) for i in range(3)]
+        monkeypatch.setattr(condor, "get_schedd_list", lambda vargs: list(ads))
+        picked = [ca["Name"] for ca in condor.get_schedds({}, 2)]
+        assert len(picked) == 2 and len(set(picked)) == 2
+        assert sorted(ca["Name"] for ca in condor.get_schedds({}, 5)) == [
+            "s0",
+            "s1",
+            "s2",
+        ]
+        assert condor.get_schedd({})["Name"] in ("s0", "s1", "s2")
+
+    @pytest.mark.unit
+    def test_supports_late_materialize_1(self):
+        """late materialization goes by the schedd CondorVersion"""
+        import classad
+
+        for version, ok in [
+            ("$CondorVersion: 9.0.13 May 26 2022 PackageID: 9.0.13-1.1 $", True),
+            ("$CondorVersion: 10.0.2 2023-02-01 BuildID: 123 $", True),
+            ("$CondorVersion: 8.8.17 Jan 10 2022 $", False),
+            ("", False),
+        ]:
+            ad = classad.ClassAd({"Name": "s1", "CondorVersion": version})
+            assert condor.supports_late_materialize(ad) == ok
+
     @pytest.mark.unit
     def test_load_submit_file_1(self, get_submit_file):
         """make sure load_submit_file result has bits of the submit file"""
@@ -133,6 +226,35 @@ class TestCondorUnit:
         assert str(res[0]).find("universe = vanilla") >= 0
         assert str(res[0]).find("executable = /bin/true") >= 0
 
+    @pytest.mark.unit
+    def test_load_submit_file_2(self, tmp_path):
+        """make sure load_submit_file gives us queue counts or item data"""
+        for queue, nqueue, has_items in [
+            ("queue", 1, False),
+            ("queue 5", 5, False),
+            ("queue a from (\n1\n2\n)", 1, True),
+            ("queue 3 a from (\n1\n2\n)", 3, True),
+        ]:
+            fname = tmp_path / "x.sub"
+            fname.write_text(f"executable = /bin/true\narguments = $(a)\n{queue}\n")
+            subm, n, items = condor.load_submit_file(str(fname))
+            assert n == nqueue
+            assert items == has_items
+        assert [d["a"] for d in subm.itemdata()] == ["1", "2"]
+        # queue counts from macros, as with --spread-schedds
+        fname.write_text("executable = /bin/true\nqueue $(JOBSUB_N)\n")
+        subm, n, items = condor.load_submit_file(str(fname), {"JOBSUB_N": "7"})
+        assert (n, items) == (7, False)
+
+    @pytest.mark.unit
+    def test_submit_native_1(self, get_submit_file, needs_credentials):
+        """actually submit a job with the python bindings"""
+        vargs = dict(TestUnit.test_vargs)
+        vargs["native_submit"] = True
+        res = condor.submit(get_submit_file, vargs, TestUnit.test_schedd)
+        print("got: ", res)
+        assert isinstance(res, int) and res > 0
+
     @pytest.mark.unit
     def test_submit_1(self, get_submit_file, needs_credentials):
         """actually submit a job with condor_submit"""
@@ -184,3 +306,160 @@ class TestJob:
                 pass
             else:
                 raise Exception(f"job id {jid} should have raised JobIdError")
+
+    @pytest.mark.unit
+    def test_get_attributes_1(self, monkeypatch):
+        import classad
+
+        handles = []
+        queries = []
+
+        class FakeSchedd:
+            def __init__(self, name):
+                handles.append(name)
+
+            def query(self, constraint, projection, limit=-1):
+                queries.append((constraint, projection, limit))
+                ads = [
+                    classad.ClassAd({"ProcId": p, "JobStatus": 2, "Iwd": f"/d{p}"})
+                    for p in range(3)
+                ]
+                return ads[:limit] if limit > 0 else ads
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        j = condor.Job("12@s1.example.com")
+        assert j.get_attributes(["JobStatus", "Iwd", "Missing"]) == {
+            "JobStatus": 2,
+            "Iwd": "/d0",
+        }
+        assert j.get_proc_attributes(["Iwd"]) == {
+            0: {"Iwd": "/d0"},
+            1: {"Iwd": "/d1"},
+            2: {"Iwd": "/d2"},
+        }
+        assert j.get_attribute("JobStatus") == 2
+        with pytest.raises(Exception):
+            j.get_attribute("Missing")
+        # one schedd handle, one query per call
+        assert handles == ["s1.example.com"]
+        assert len(queries) == 4
+        assert queries[0] == (
+            "ClusterId==12",
+            ["JobStatus", "Iwd", "Missing", "ProcId"],
+            1,
+        )
+
+
+class TestJobSet:
+    @pytest.mark.unit
+    def test_jobset_group_1(self):
+        js = condor.JobSet(
+            ["1@s1.example.com", "2.3@s1.example.com", "2.5@s1.example.com"]
+            + [condor.Job("7.0@s2.example.com")]
+        )
+        assert len(js) == 4
+        assert js.schedds == ["s1.example.com", "s2.example.com"]
+        assert js.constraint("s1.example.com") == (
+            "member(ClusterId, {1}) || (ClusterId==2 && member(ProcId, {3,5}))"
+        )
+        assert js.constraint("s1.example.com", whole_clusters=True) == (
+            "member(ClusterId, {1,2})"
+        )
+        assert js.constraint("s3.example.com") == "false"
+
+    @pytest.mark.unit
+    def test_jobset_get_attributes_1(self, monkeypatch):
+        import classad
+
+        queries = []
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def query(self, constraint, projection):
+                queries.append((self.name, constraint, projection))
+                if self.name == "bad.example.com":
+                    raise RuntimeError("schedd down")
+                return [classad.ClassAd({"ClusterId": 1, "ProcId": 0, "JobStatus": 2})]
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        js = condor.JobSet(["1@s1.example.com", "1@bad.example.com"])
+        res = js.get_attributes(["JobStatus"])
+        assert list(res) == ["1.0@s1.example.com"]
+        assert res["1.0@s1.example.com"]["JobStatus"] == 2
+        assert list(js.errors) == ["bad.example.com"]
+        assert all(q[2] == ["ClusterId", "ProcId", "JobStatus"] for q in queries)
+
+    @pytest.mark.unit
+    def test_jobset_act_1(self, monkeypatch):
+        """one act per schedd, ids and constraints together"""
+        import classad
+        import htcondor
+
+        acts = []
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def act(self, action, constraint, reason=None):
+                acts.append((self.name, action, constraint, reason))
+                return classad.ClassAd({"TotalSuccess": 3, "TotalNotFound": 0})
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        js = condor.JobSet(["12@s1.example.com", "7.1@s2.example.com"])
+        js.add_constraint("s3.example.com", 'Owner=="bob"')
+        res = js.act(htcondor.JobAction.Hold, "because")
+        assert sorted(res) == ["s1.example.com", "s2.example.com", "s3.example.com"]
+        assert sorted(js.latencies) == sorted(res)
+        assert sorted(acts) == [
+            (
+                "s1.example.com",
+                htcondor.JobAction.Hold,
+                "member(ClusterId, {12})",
+                "because",
+            ),
+            (
+                "s2.example.com",
+                htcondor.JobAction.Hold,
+                "(ClusterId==7 && member(ProcId, {1}))",
+                "because",
+            ),
+            ("s3.example.com", htcondor.JobAction.Hold, '(Owner=="bob")', "because"),
+        ]
+
+    @pytest.mark.unit
+    def test_query_jobs_1(self, monkeypatch):
+        """results from every schedd, a slow or broken one ends up in errors"""
+        import classad
+        import threading
+
+        stall = threading.Event()
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def xquery(self, constraint, projection):
+                if self.name == "bad.example.com":
+                    raise RuntimeError("schedd down")
+                if self.name == "slow.example.com":
+                    stall.wait(5)
+                yield classad.ClassAd({"ClusterId": 1, "ProcId": 0})
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        errors = {}
+        res = list(
+            condor.query_jobs(
+                ["s1.example.com", "bad.example.com", "slow.example.com"],
+                "true",
+                ["ClusterId", "ProcId"],
+                timeout=0.5,
+                errors=errors,
+            )
+        )
+        stall.set()
+        assert [name for name, _ in res] == ["s1.example.com"]
+        assert sorted(errors) == ["bad.example.com", "slow.example.com"]
+        assert isinstance(errors["slow.example.com"], TimeoutError)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import digest_cache
+import tarfiles
+
+
+@pytest.fixture
+def cache_home(cache_home, monkeypatch):
+    monkeypatch.setattr(digest_cache, "DIGEST_CACHE", True)
+    monkeypatch.setattr(digest_cache, "DIGEST_CACHE_SIZE", 2)
+    return cache_home
+
+
+class TestDigestCacheUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/digest_cache.py routines...
+
+    @pytest.mark.unit
+    def test_cached_digest_1(self, cache_home):
+        """unchanged files are hashed once, changed ones again"""
+        calls = []
+
+        def compute(fname):
+            calls.append(fname)
+            return tarfiles.hash_file(fname)
+
+        f = cache_home / "a.tar.gz"
+        f.write_bytes(b"first")
+        d1 = digest_cache.cached_digest(str(f), compute)
+        assert digest_cache.cached_digest(str(f), compute) == d1
+        assert len(calls) == 1
+
+        f.write_bytes(b"second")
+        os.utime(f, ns=(time.time_ns(), time.time_ns() + 10**9))
+        d2 = digest_cache.cached_digest(str(f), compute)
+        assert d2 != d1 and len(calls) == 2
+        assert tarfiles.file_digest(str(f)) == d2
+        assert len(calls) == 2
+
+    @pytest.mark.unit
+    def test_lru_1(self, cache_home):
+        """the least recently used digests are dropped"""
+        files = []
+        for name in "abc":
+            f = cache_home / name
+            f.write_bytes(name.encode())
+            files.append(str(f))
+        keys = [digest_cache.file_key(f) for f in files]
+        digest_cache.store(keys[0], "a")
+        digest_cache.store(keys[1], "b")
+        # use a, so b is the least recently used
+        assert digest_cache.lookup(keys[0]) == "a"
+        digest_cache.store(keys[2], "c")
+        assert digest_cache.lookup(keys[1]) is None
+        assert digest_cache.lookup(keys[0]) == "a"
+        assert digest_cache.lookup(keys[2]) == "c"
@@ -123,8 +123,11 @@ def all_test_args():
     return [
         "--append-condor-requirements",
         "xxappend-condor-requirementsxx",
+        "--arg-matrix",
+        "xxarg-matrixxx",
         "--blacklist",
         "xxblacklistxx",
+        "--canonical-tar",
         "--cmtconfig",
         "xxcmtconfigxx",
         "--cpu",
@@ -175,6 +178,8 @@ def all_test_args():
         "xxoverwrite-condor-requirementsxx",
         "--project-name",
         "xxproject-namexx",
+        "--queue-from",
+        "xxqueue-fromxx",
         "--resource-provides",
         "xxresource-providesxx",
         "--role",
@@ -182,8 +187,12 @@ def all_test_args():
         "--singularity-image",
         "xxsingularity-imagexx",
         "--apptainer-image",
+        "--schedd-selection",
+        "p2c",
         "--site",
         "xxsitexx",
+        "--spread-schedds",
+        "xxspread-scheddsxx",
         "--subgroup",
         "xxsubgroupxx",
         "--support-email",
@@ -193,6 +202,9 @@ def all_test_args():
         "xxtarball-exclusion-filexx",
         "--timeout",
         "xxtimeoutxx",
+        "--timings",
+        "--timings-json",
+        "xxtimings-jsonxx",
         "--use-cvmfs-dropbox",
         "--use-pnfs-dropbox",
         "--verbose",
@@ -326,6 +338,8 @@ class TestGetParserUnit:
                 assert vres["d"] == [["dtag", "dpath"]]
             elif arg == "debug" or arg == "verbose":
                 assert vres["verbose"] == 1
+            elif arg == "schedd-selection":
+                assert vres["schedd_selection"] == "p2c"
             elif arg == "dataset":
                 assert vres["dataset_definition"] == "xxdataset-definitionxx"
             elif arg in listargs:
@@ -0,0 +1,155 @@
+import os
+import sys
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import classad
+import condor
+import history
+
+
+class FakeSchedd:
+    """schedd history newest first, stopping at since like the real one"""
+
+    records = {}
+    calls = []
+
+    def __init__(self, name):
+        self.name = name
+
+    def history(self, constraint, projection, match=-1, since=None):
+        self.calls.append((self.name, since))
+        for ad in reversed(self.records[self.name]):
+            if since == f"{ad['ClusterId']}.{ad['ProcId']}":
+                return
+            yield classad.ClassAd(ad)
+
+
+@pytest.fixture
+def fake_schedds(cache_home, monkeypatch):
+    monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+    FakeSchedd.calls = []
+    FakeSchedd.records = {
+        "s1.example.com": [
+            {"ClusterId": 1, "ProcId": 0, "CompletionDate": 100},
+            {"ClusterId": 2, "ProcId": 0, "CompletionDate": 200},
+        ],
+        "s2.example.com": [
+            {"ClusterId": 7, "ProcId": 0, "CompletionDate": 150},
+        ],
+    }
+    return FakeSchedd
+
+
+def ids(results):
+    return sorted(f"{ad['ClusterId']}.{ad['ProcId']}@{n}" for n, ad in results)
+
+
+class TestHistoryUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/history.py routines...
+
+    @pytest.mark.unit
+    def test_query_history_1(self, fake_schedds):
+        """without a cursor, everything every time"""
+        schedds = ["s1.example.com", "s2.example.com"]
+        for _ in range(2):
+            res = list(history.query_history(schedds, "true", ["Owner"]))
+            assert ids(res) == [
+                "1.0@s1.example.com",
+                "2.0@s1.example.com",
+                "7.0@s2.example.com",
+            ]
+        assert all(since is None for _, since in fake_schedds.calls)
+
+    @pytest.mark.unit
+    def test_query_history_cursor_1(self, fake_schedds):
+        """with a cursor, only what's new since last time"""
+        schedds = ["s1.example.com", "s2.example.com"]
+        res = list(history.query_history(schedds, "true", ["Owner"], cursor="dash"))
+        assert len(res) == 3
+        fake_schedds.records["s1.example.com"].append(
+            {"ClusterId": 3, "ProcId": 1, "CompletionDate": 300}
+        )
+        res = list(history.query_history(schedds, "true", ["Owner"], cursor="dash"))
+        assert ids(res) == ["3.1@s1.example.com"]
+        assert sorted(fake_schedds.calls[-2:]) == [
+            ("s1.example.com", "2.0"),
+            ("s2.example.com", "7.0"),
+        ]
+        # nothing new, and the cursor stays put
+        for _ in range(2):
+            res = list(history.query_history(schedds, "true", [], cursor="dash"))
+            assert res == []
+        # a different constraint is a different cursor
+        res = list(history.query_history(schedds, "false", [], cursor="dash"))
+        assert len(res) == 4
+
+    @pytest.mark.unit
+    def test_harvest_local_1(self, fake_schedds):
+        """harvested jobs can be listed and summarized locally"""
+        fake_schedds.records["s1.example.com"] = [
+            {
+                "ClusterId": 1,
+                "ProcId": p,
+                "JobsubJobId": f"1.{p}@s1.example.com",
+                "Owner": "bob",
+                "Jobsub_Group": "fermilab",
+                "JobsubCmd": "sim.sh",
+                "QDate": 1000,
+                "CompletionDate": 2000 + p,
+                "JobStatus": 4,
+                "ExitCode": p % 2,
+                "RemoteWallClockTime": 100.0 * (p + 1),
+            }
+            for p in range(4)
+        ]
+        fake_schedds.records["s2.example.com"] = [
+            {
+                "ClusterId": 7,
+                "ProcId": 0,
+                "Owner": "alice",
+                "Jobsub_Group": "dune",
+                "Cmd": "/path/to/reco.sh",
+                "QDate": 5000,
+                "CompletionDate": 6000,
+                "JobStatus": 3,
+            }
+        ]
+        schedds = ["s1.example.com", "s2.example.com"]
+        assert history.harvest(schedds, "true") == 5
+        # the second harvest only gets what's new
+        assert history.harvest(schedds, "true") == 0
+
+        jobs = history.local_jobs(["bob"])
+        assert [ad["JobsubJobId"] for ad in jobs][:2] == [
+            "1.3@s1.example.com",
+            "1.2@s1.example.com",
+        ]
+        assert len(history.local_jobs(["7"])) == 1
+        assert len(history.local_jobs([], "dune")) == 1
+        assert len(history.local_jobs([], qdate_range=(4000, 9000))) == 1
+
+        summary = history.local_summary("cmd", [])
+        assert summary == [
+            ("sim.sh", 4, 2, 250.0, None, None),
+            ("reco.sh", 1, 1, None, None, None),
+        ]
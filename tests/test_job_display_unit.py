@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import time
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import classad
+import job_display
+
+
+def make_ad(**kwargs):
+    ad = {
+        "GlobalJobId": "s1.example.com#12.3#1700000000",
+        "ClusterId": 12,
+        "ProcId": 3,
+        "Owner": "bob",
+        "QDate": 1700000000,
+        "RemoteWallClockTime": 90061.0,
+        "JobStatus": 2,
+        "JobPrio": 0,
+        "ImageSize": 2048,
+        "Cmd": "/bin/true",
+    }
+    ad.update(kwargs)
+    return classad.ClassAd(ad)
+
+
+class TestJobDisplayUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/job_display.py routines...
+
+    @pytest.mark.unit
+    def test_format_duration_1(self):
+        assert job_display.format_duration(90061) == "1+01:01:01"
+        assert job_display.format_duration(None) == "0+00:00:00"
+
+    @pytest.mark.unit
+    def test_format_q_row_1(self):
+        """columns line up with the jobsub_q header"""
+        row = job_display.format_q_row(make_ad(Args="a b c"))
+        qdate = time.strftime("%m/%d %H:%M", time.localtime(1700000000))
+        assert row == (
+            f"12.3@s1.example.com                     bob       \t{qdate} "
+            "1+01:01:01  R    0    2.0 /bin/true a b c"
+        )
+
+    @pytest.mark.unit
+    def test_format_q_row_undefined_1(self):
+        """undefined attributes leave their columns out, as with -format"""
+        row = job_display.format_q_row(
+            make_ad(RemoteWallClockTime=classad.Value.Undefined, JobPrio=None)
+        )
+        qdate = time.strftime("%m/%d %H:%M", time.localtime(1700000000))
+        assert row == (
+            f"12.3@s1.example.com                     bob       \t{qdate} "
+            " R    2.0 /bin/true"
+        )
+
+    @pytest.mark.unit
+    def test_format_q_row_dag_1(self):
+        """DAG nodes show their node name, JobsubCmd wins over Cmd"""
+        row = job_display.format_q_row(
+            make_ad(DAGNodeName="stage1", JobsubCmd="jobsub_submit x", JobStatus=1)
+        )
+        assert row.split("\t")[0].endswith(" |-stage1 ")
+        assert " I " in row
+        assert row.endswith("jobsub_submit x")
+
+    @pytest.mark.unit
+    def test_queue_summary_1(self):
+        """jobs are counted by cluster, DAG nodes by their DAG"""
+        qs = job_display.QueueSummary()
+        for status in [1, 1, 2, 5]:
+            qs.add(
+                "s1.example.com",
+                classad.ClassAd({"ClusterId": 12, "JobStatus": status}),
+            )
+        for cluster in [20, 21]:
+            qs.add(
+                "s1.example.com",
+                classad.ClassAd(
+                    {"ClusterId": cluster, "JobStatus": 2, "DAGManJobId": 19}
+                ),
+            )
+        qs.add("s2.example.com", classad.ClassAd({"ClusterId": 7, "JobStatus": 6}))
+        lines = qs.lines()
+        assert lines[0].split() == (
+            "CLUSTER TOTAL IDLE RUN HELD DONE REMOVED OTHER".split()
+        )
+        assert lines[1].split() == "12@s1.example.com 4 2 1 1 0 0 0".split()
+        assert lines[2].split() == "19@s1.example.com (DAG) 2 0 2 0 0 0 0".split()
+        assert lines[3].split()[:3] == ["total", "s1.example.com", "6"]
+        assert lines[4].split()[0] == "7@s2.example.com"
+        assert lines[-1].split() == "total 7 2 3 1 0 0 1".split()
+
+    @pytest.mark.unit
+    def test_format_jsonl_1(self):
+        """one line of JSON with just the attributes asked for, in order"""
+        ad = make_ad(Args="a b c")
+        ad["Next"] = classad.ExprTree("ClusterId + 1")
+        line = job_display.format_jsonl(ad, ["ProcId", "Args", "Next", "Missing"])
+        assert "\n" not in line and " " not in line.replace("a b c", "")
+        assert list(json.loads(line).items()) == [
+            ("ProcId", 3),
+            ("Args", "a b c"),
+            ("Next", 13),
+            ("Missing", None),
+        ]
+        assert json.loads(job_display.format_jsonl(ad))["GlobalJobId"] == (
+            "s1.example.com#12.3#1700000000"
+        )
+        assert job_display.parse_attrs("ClusterId, ProcId,,Owner") == [
+            "ClusterId",
+            "ProcId",
+            "Owner",
+        ]
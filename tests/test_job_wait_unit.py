@@ -0,0 +1,178 @@
+import os
+import sys
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import classad
+import condor
+import job_wait
+
+SUBMIT_EVENT = """000 ({c:03d}.{p:03d}.000) 2023-10-01 12:00:00 Job submitted from host: <1.2.3.4:9618>
+...
+"""
+
+TERMINATED_EVENT = """005 ({c:03d}.{p:03d}.000) 2023-10-01 12:01:00 Job terminated.
+	(1) Normal termination (return value {rv})
+		Usr 0 00:00:00, Sys 0 00:00:00  -  Run Remote Usage
+		Usr 0 00:00:00, Sys 0 00:00:00  -  Run Local Usage
+		Usr 0 00:00:00, Sys 0 00:00:00  -  Total Remote Usage
+		Usr 0 00:00:00, Sys 0 00:00:00  -  Total Local Usage
+	0  -  Run Bytes Sent By Job
+	0  -  Run Bytes Received By Job
+	0  -  Total Bytes Sent By Job
+	0  -  Total Bytes Received By Job
+...
+"""
+
+ABORTED_EVENT = """009 ({c:03d}.{p:03d}.000) 2023-10-01 12:02:00 Job was aborted.
+	via condor_rm (by user bob)
+...
+"""
+
+
+class TestJobWaitUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/job_wait.py routines...
+
+    @pytest.mark.unit
+    def test_log_waiter_1(self, tmp_path):
+        """jobs in a log are reported as they finish, with no schedd queries"""
+        log = tmp_path / "jobs.log"
+        log.write_text(
+            SUBMIT_EVENT.format(c=12, p=0)
+            + SUBMIT_EVENT.format(c=12, p=1)
+            + TERMINATED_EVENT.format(c=12, p=0, rv=3)
+        )
+        done = []
+        w = job_wait.Waiter(
+            [condor.Job("12@s1.example.com")], [str(log)], 0.1, done.append
+        )
+        assert [r["id"] for r in done] == ["12.0"]
+        assert done[0]["exit_code"] == 3
+        assert not w.wait(timeout=0.1)
+        assert w.pending() == ["12@s1.example.com"]
+        with open(log, "a") as f:
+            f.write(ABORTED_EVENT.format(c=12, p=1))
+        assert w.wait(timeout=2)
+        assert w.schedd_queries == 0
+        assert w.summary() == {"failed": 2, "completed": 1, "removed": 1}
+
+    @pytest.mark.unit
+    def test_schedd_waiter_1(self, monkeypatch):
+        """without a log, one query per schedd finds finished jobs"""
+        queue = {
+            "s1.example.com": [
+                {"ClusterId": 12, "ProcId": 0, "JobStatus": 4, "ExitCode": 0},
+                {"ClusterId": 12, "ProcId": 1, "JobStatus": 2},
+            ],
+            "s2.example.com": [
+                {"ClusterId": 7, "ProcId": 0, "JobStatus": 3},
+            ],
+        }
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def query(self, constraint, projection):
+                return [classad.ClassAd(ad) for ad in queue[self.name]]
+
+            def history(self, constraint, projection, match=-1):
+                return [classad.ClassAd(ad) for ad in gone[self.name]]
+
+        gone = {"s1.example.com": []}
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        done = []
+        w = job_wait.Waiter(
+            [condor.Job("12@s1.example.com"), condor.Job("7@s2.example.com")],
+            interval=0.05,
+            on_done=done.append,
+        )
+        assert not w.wait(timeout=0.01)
+        assert sorted(r["id"] for r in done) == [
+            "12.0@s1.example.com",
+            "7.0@s2.example.com",
+        ]
+        assert w.pending() == ["12@s1.example.com"]
+        # 12.1 leaves the queue, how it finished is in the history
+        gone["s1.example.com"].append(
+            {"ClusterId": 12, "ProcId": 1, "JobStatus": 4, "ExitCode": 3}
+        )
+        queue["s1.example.com"].pop()
+        assert w.wait(timeout=1)
+        assert w.results["12.1@s1.example.com"]["status"] == "completed"
+        assert w.results["12.1@s1.example.com"]["exit_code"] == 3
+        # the second time only s1.example.com has jobs we wait for, and
+        # its history is asked about 12.1
+        assert w.schedd_queries == 4
+
+    @pytest.mark.unit
+    def test_schedd_waiter_left_queue_1(self, monkeypatch):
+        """a job gone from the queue and the history isn't a success"""
+        queue = [{"ClusterId": 12, "ProcId": 0, "JobStatus": 2}]
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def query(self, constraint, projection):
+                return [classad.ClassAd(ad) for ad in queue]
+
+            def history(self, constraint, projection, match=-1):
+                assert match == 1
+                return []
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        w = job_wait.Waiter([condor.Job("12@s1.example.com")], interval=0.05)
+        assert not w.wait(timeout=0.01)
+        queue.pop()
+        assert w.wait(timeout=1)
+        assert w.results["12.0@s1.example.com"]["status"] == job_wait.LEFT_QUEUE
+        assert w.summary() == {"failed": 1, job_wait.LEFT_QUEUE: 1}
+
+    @pytest.mark.unit
+    def test_schedd_waiter_already_gone_1(self, monkeypatch):
+        """jobs gone before we started go by the history, or aren't found"""
+        history = {
+            "s1.example.com": [
+                {"ClusterId": 12, "ProcId": 0, "JobStatus": 4, "ExitCode": 7}
+            ],
+        }
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def query(self, constraint, projection):
+                return []
+
+            def history(self, constraint, projection, match=-1):
+                return [classad.ClassAd(ad) for ad in history.get(self.name, [])]
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        w = job_wait.Waiter(
+            [condor.Job("12@s1.example.com"), condor.Job("99@s2.example.com")],
+            interval=0.05,
+        )
+        assert w.wait(timeout=1)
+        assert w.results["12.0@s1.example.com"]["exit_code"] == 7
+        assert w.results["99@s2.example.com"]["status"] == job_wait.NOT_FOUND
+        assert w.summary() == {"failed": 2, "completed": 1, job_wait.NOT_FOUND: 1}
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import condor
+
+try:
+    os.unlink("jobsub_cmd.py")
+except:
+    pass
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    if not os.path.exists("jobsub_cmd.py"):
+        os.symlink("/opt/jobsub_lite/bin/jobsub_cmd", "jobsub_cmd.py")
+else:
+    if not os.path.exists("jobsub_cmd.py"):
+        os.symlink("../bin/jobsub_cmd", "jobsub_cmd.py")
+import jobsub_cmd
+
+
+class TestJobsubCmdUnit:
+    """
+    Use with pytest... unit tests for ../bin/jobsub_cmd
+    """
+
+    @pytest.mark.unit
+    def test_sort_job_ids_1(self):
+        """ids on one schedd stay in the args, with that schedd"""
+        args, schedd, by_schedd = jobsub_cmd.sort_job_ids(
+            ["-debug", "12.0@s1.example.com", "13@s1.example.com"], None
+        )
+        assert args == ["-debug", "12.0", "13"]
+        assert schedd == "s1.example.com"
+        assert by_schedd == {}
+
+        args, schedd, by_schedd = jobsub_cmd.sort_job_ids(
+            ["@s2.example.com", "-better-analyze"], None
+        )
+        assert (args, schedd, by_schedd) == (["-better-analyze"], "s2.example.com", {})
+
+    @pytest.mark.unit
+    def test_sort_job_ids_2(self):
+        """ids on two schedds each keep their own schedd"""
+        args, schedd, by_schedd = jobsub_cmd.sort_job_ids(
+            ["1@schedda.fnal.gov", "2@scheddb.fnal.gov", "3@schedda.fnal.gov"],
+            None,
+        )
+        assert args == []
+        assert schedd is None
+        assert by_schedd == {
+            "schedda.fnal.gov": ["1", "3"],
+            "scheddb.fnal.gov": ["2"],
+        }
+
+        # and likewise for composite ids from --spread-schedds
+        args, schedd, by_schedd = jobsub_cmd.sort_job_ids(
+            ["4@schedda.fnal.gov,5@scheddb.fnal.gov"], None
+        )
+        assert by_schedd == {
+            "schedda.fnal.gov": ["4"],
+            "scheddb.fnal.gov": ["5"],
+        }
+
+    @pytest.mark.unit
+    def test_native_act_1(self, monkeypatch, capsys):
+        """jobsub_rm of ids on two schedds removes each on its own schedd"""
+        import classad
+
+        acts = []
+
+        class FakeSchedd:
+            def __init__(self, name):
+                self.name = name
+
+            def act(self, action, constraint, reason=None):
+                acts.append((self.name, constraint))
+                return classad.ClassAd({"TotalSuccess": 1})
+
+        monkeypatch.setattr(condor, "get_schedd_handle", FakeSchedd)
+        _, _, targets = jobsub_cmd.sort_job_ids(
+            ["1@schedda.fnal.gov", "2@scheddb.fnal.gov"], None
+        )
+        rc = jobsub_cmd.native_act("jobsub_rm", targets, "", "", 0)
+        assert sorted(acts) == [
+            ("schedda.fnal.gov", "member(ClusterId, {1})"),
+            ("scheddb.fnal.gov", "member(ClusterId, {2})"),
+        ]
+        assert "2 jobs removed on 2 schedds" in capsys.readouterr().out
+        assert not rc
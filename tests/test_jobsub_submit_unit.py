@@ -19,6 +19,7 @@ if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
 else:
     sys.path.append("../lib")
 
+import condor
 import utils
 
 from test_unit import TestUnit
@@ -92,3 +93,125 @@ class TestJobsubSubmitUnit:
         jobsub_submit.do_dataset_defaults(varg)
         for var in ["PROJECT", "DATASET", "USER", "GROUP", "STATION"]:
             assert repr(varg["environment"]).find("SAM_%s" % var) > 0
+
+    @pytest.mark.unit
+    def test_read_batch_file_1(self, tmp_path):
+        """batch files take JSON lists, JSON objects, or plain arguments"""
+        bf = tmp_path / "batch.jsonl"
+        bf.write_text(
+            "# comment\n"
+            '["-N", "2", "file://a.sh", "x y"]\n'
+            "\n"
+            '{"name": "second", "args": ["--memory", "1GB", "file://b.sh"]}\n'
+            "-N 3 file://c.sh 'z w'\n"
+        )
+        specs = jobsub_submit.read_batch_file(str(bf))
+        assert specs == [
+            (f"{bf}:2", ["-N", "2", "file://a.sh", "x y"]),
+            ("second", ["--memory", "1GB", "file://b.sh"]),
+            (f"{bf}:5", ["-N", "3", "file://c.sh", "z w"]),
+        ]
+        bf.write_text('{"name": "noargs"}\n')
+        with pytest.raises(SystemExit):
+            jobsub_submit.read_batch_file(str(bf))
+
+    @pytest.mark.unit
+    def test_render_files_queue_items_1(self, tmp_path):
+        """--arg-matrix values become simple.cmd item data in one cluster"""
+        if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+            srcdir = "/opt/jobsub_lite/templates/simple"
+        else:
+            srcdir = os.path.dirname(os.path.dirname(__file__)) + "/templates/simple"
+        args = {**TestUnit.test_vargs, **TestUnit.test_extra_template_args}
+        args["outdir"] = str(tmp_path)
+        args["proxy"] = "/fake/proxy/path"
+        args["N"] = 2
+        args["queue_vars"], args["queue_items"] = utils.get_queue_items(
+            None, ["seed=1,2,3"]
+        )
+        args["transfer_files"] = []
+        args["usage_model"] = "OPPORTUNISTIC"
+        args["no_singularity"] = True
+        args["resource_provides_quoted"] = []
+        cmd = jobsub_submit.get_jinja_env(srcdir).get_template("simple.cmd")
+        (tmp_path / "simple.cmd").write_text(cmd.render(**args))
+        subm, count, has_items = condor.load_submit_file(f"{tmp_path}/simple.cmd")
+        assert count == 2 and has_items
+        assert [d["seed"] for d in subm.itemdata()] == ["1", "2", "3"]
+        assert subm["environment"].startswith("seed=$(seed);")
+        assert "max_materialize" not in subm.keys()
+        # --maxConcurrent as one late materialized cluster
+        args["max_materialize"] = 20
+        (tmp_path / "simple.cmd").write_text(cmd.render(**args))
+        subm, count, has_items = condor.load_submit_file(f"{tmp_path}/simple.cmd")
+        assert subm["max_materialize"] == "20"
+
+    @pytest.mark.unit
+    def test_check_queue_items_1(self):
+        """--queue-from and --arg-matrix only go with a one cluster submission"""
+        varg = {"arg_matrix": ["seed=1,2"], "dag": False, "maxConcurrent": "5"}
+        jobsub_submit.check_queue_items(varg)
+        with pytest.raises(SystemExit, match="--maxConcurrent"):
+            jobsub_submit.check_queue_items(varg, late_materialize=False)
+        for k in ("dag", "dataset_definition"):
+            with pytest.raises(SystemExit, match=f"--{k.replace('_', '-')}"):
+                jobsub_submit.check_queue_items({"queue_from": "q.txt", k: "x"})
+        jobsub_submit.check_queue_items({"dag": True, "arg_matrix": []})
+
+    @pytest.mark.unit
+    def test_render_dagman_sub_1(self, tmp_path):
+        """every dag flavour renders its own dagman .condor.sub"""
+        if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+            tdir = "/opt/jobsub_lite/templates"
+        else:
+            tdir = os.path.dirname(os.path.dirname(__file__)) + "/templates"
+        args = {**TestUnit.test_vargs, **TestUnit.test_extra_template_args}
+        args["proxy"] = "/fake/proxy/path"
+        args["transfer_files"] = ["simple.cmd", "simple.sh"]
+        args["csd_version"] = condor.get_csd_version()
+        for flavour, dag in [
+            ("dag", "dag.dag"),
+            ("dataset_dag", "dataset.dag"),
+            ("maxconcurrent_dag", "maxconcurrent.dag"),
+        ]:
+            env = jobsub_submit.get_jinja_env(f"{tdir}/{flavour}")
+            subfile = tmp_path / f"{dag}.condor.sub"
+            subfile.write_text(env.get_template(f"{dag}.condor.sub").render(**args))
+            subm, count, has_items = condor.load_submit_file(str(subfile))
+            assert count == 1 and not has_items
+            assert subm["universe"] == "scheduler"
+            assert f"-Dag {dag} " in subm["arguments"]
+            assert "-CsdVersion $CondorVersion:' '" in subm["arguments"]
+
+    @pytest.mark.unit
+    def test_render_spread_schedds_1(self, tmp_path):
+        """one simple.cmd serves every --spread-schedds cluster"""
+        if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+            srcdir = "/opt/jobsub_lite/templates/simple"
+        else:
+            srcdir = os.path.dirname(os.path.dirname(__file__)) + "/templates/simple"
+        args = {**TestUnit.test_vargs, **TestUnit.test_extra_template_args}
+        args["outdir"] = str(tmp_path)
+        args["proxy"] = "/fake/proxy/path"
+        args["transfer_files"] = []
+        args["usage_model"] = "OPPORTUNISTIC"
+        args["no_singularity"] = True
+        args["resource_provides_quoted"] = []
+        # as set_extras_n_fix_units would leave them
+        args["environment"] = ["USER=test_user"]
+        args.update(memory=65536.0, disk=102400.0, expected_lifetime=28800.0)
+        args["spread_schedds"] = 2
+        args["schedd"] = "$(JOBSUB_SCHEDD)"
+        args["N"] = "$(JOBSUB_N)"
+        cmd = jobsub_submit.get_jinja_env(srcdir).get_template("simple.cmd")
+        (tmp_path / "simple.cmd").write_text(cmd.render(**args))
+        macros = {"JOBSUB_SCHEDD": "s2", "JOBSUB_N": "3", "JOBSUB_PROC_OFFSET": "5"}
+        subm, count, _ = condor.load_submit_file(f"{tmp_path}/simple.cmd", macros)
+        assert count == 3
+        envs = [j["Environment"] for j in subm.jobs(count=count)]
+        assert [e.split("JOBSUBJOBSECTION=")[1].split()[0] for e in envs] == [
+            "5",
+            "6",
+            "7",
+        ]
+        assert "@s2" in envs[0]
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import ledger
+
+
+@pytest.fixture
+def cache_home(cache_home, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER", True)
+    monkeypatch.setattr(ledger, "LEDGER_MAX_AGE", 3600)
+    return cache_home
+
+
+class TestLedgerUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/ledger.py routines...
+
+    @pytest.mark.unit
+    def test_record_1(self, cache_home):
+        """recorded clusters are live, by schedd and group"""
+        ledger.record("s1.example.com", 12, 10, False, "fermilab")
+        ledger.record("s1.example.com", 13, 1, True, "fermilab")
+        ledger.record("s2.example.com", 12, 5, False, "dune")
+        assert ledger.live_clusters() == {
+            "s1.example.com": {12, 13},
+            "s2.example.com": {12},
+        }
+        assert ledger.live_clusters("dune") == {"s2.example.com": {12}}
+        assert ledger.find_cluster(12) == ["s1.example.com", "s2.example.com"]
+        assert ledger.find_cluster(13) == ["s1.example.com"]
+
+    @pytest.mark.unit
+    def test_forget_and_age_1(self, cache_home, monkeypatch):
+        """clusters we saw leave the queue, or that are too old, are gone"""
+        ledger.record("s1.example.com", 12, 10, False, "fermilab")
+        ledger.record("s1.example.com", 13, 10, False, "fermilab")
+        ledger.forget("s1.example.com", [12])
+        assert ledger.live_clusters() == {"s1.example.com": {13}}
+        now = time.time()
+        monkeypatch.setattr(ledger.time, "time", lambda: now + 7200)
+        assert ledger.live_clusters() == {}
+
+    @pytest.mark.unit
+    def test_disabled_1(self, cache_home, monkeypatch):
+        """JOBSUB_LEDGER=0 turns the ledger off"""
+        monkeypatch.setattr(ledger, "LEDGER", False)
+        ledger.record("s1.example.com", 12, 10, False, "fermilab")
+        assert not os.path.exists(ledger.ledger_path())
+        assert ledger.live_clusters() == {}
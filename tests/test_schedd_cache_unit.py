@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import classad
+import schedd_cache
+
+
+def make_ad(name, downtime=False):
+    return classad.ClassAd(
+        {
+            "Name": name,
+            "Machine": name,
+            "IsJobsubLite": True,
+            "SupportedVOList": "fermilab",
+            "InDownTime": downtime,
+        }
+    )
+
+
+@pytest.fixture
+def cache_home(cache_home, monkeypatch):
+    monkeypatch.setattr(schedd_cache, "SCHEDD_CACHE_TTL", 300)
+    monkeypatch.setattr(schedd_cache, "SCHEDD_CACHE_MAX_AGE", 3600)
+    return cache_home
+
+
+class TestScheddCacheUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/schedd_cache.py routines...
+
+    @pytest.mark.unit
+    def test_store_lookup_1(self, cache_home):
+        """ads we store come back fresh, with their attributes"""
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [make_ad("s1.example.com"), make_ad("s2.example.com")])
+        ads, stale = schedd_cache.lookup(key)
+        assert not stale
+        assert [ad["Name"] for ad in ads] == ["s1.example.com", "s2.example.com"]
+        assert ads[0].eval("IsJobsubLite") == True
+
+    @pytest.mark.unit
+    def test_lookup_miss_1(self, cache_home):
+        """other groups or dev schedds are separate entries"""
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [make_ad("s1.example.com")])
+        other = schedd_cache.cache_key(
+            "collector", {"group": "fermilab", "devserver": True}
+        )
+        assert schedd_cache.lookup(other) == (None, False)
+
+    @pytest.mark.unit
+    def test_stale_and_expired_1(self, cache_home, monkeypatch):
+        """entries past the TTL are stale, past the max age they are gone"""
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [make_ad("s1.example.com")])
+        now = time.time()
+        monkeypatch.setattr(schedd_cache.time, "time", lambda: now + 600)
+        ads, stale = schedd_cache.lookup(key)
+        assert ads and stale
+        monkeypatch.setattr(schedd_cache.time, "time", lambda: now + 7200)
+        assert schedd_cache.lookup(key) == (None, False)
+
+    @pytest.mark.unit
+    def test_invalidate_1(self, cache_home):
+        """a failed schedd drops the entries that list it"""
+        k1 = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        k2 = schedd_cache.cache_key("collector", {"group": "dune"})
+        schedd_cache.store(k1, [make_ad("s1.example.com")])
+        schedd_cache.store(k2, [make_ad("s2.example.com")])
+        schedd_cache.invalidate("s1.example.com")
+        assert schedd_cache.lookup(k1) == (None, False)
+        assert schedd_cache.lookup(k2)[0] is not None
+
+    @pytest.mark.unit
+    def test_downtime_change_1(self, cache_home):
+        """a schedd going into downtime clears entries for other groups"""
+        k1 = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        k2 = schedd_cache.cache_key("collector", {"group": "dune"})
+        schedd_cache.store(k1, [make_ad("s1.example.com")])
+        schedd_cache.store(k2, [make_ad("s1.example.com")])
+        schedd_cache.store(k1, [make_ad("s1.example.com", downtime=True)])
+        assert schedd_cache.lookup(k2) == (None, False)
+        ads, _ = schedd_cache.lookup(k1)
+        assert ads[0].eval("InDownTime") == True
+
+    @pytest.mark.unit
+    def test_store_empty_1(self, cache_home):
+        """an empty collector answer isn't cached"""
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [])
+        assert schedd_cache.lookup(key) == (None, False)
+        schedd_cache.store(key, [make_ad("s1.example.com")])
+        schedd_cache.store(key, [])
+        assert schedd_cache.lookup(key)[0] is not None
+
+    @pytest.mark.unit
+    def test_refresh_in_background_1(self, cache_home):
+        """background refresh replaces the entry"""
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [make_ad("s1.example.com")])
+        t = schedd_cache.refresh_in_background(key, lambda: [make_ad("s3.example.com")])
+        assert t.daemon
+        t.join()
+        ads, _ = schedd_cache.lookup(key)
+        assert [ad["Name"] for ad in ads] == ["s3.example.com"]
+
+    @pytest.mark.unit
+    def test_disabled_1(self, cache_home, monkeypatch):
+        """a TTL of 0 turns the cache off"""
+        monkeypatch.setattr(schedd_cache, "SCHEDD_CACHE_TTL", 0)
+        key = schedd_cache.cache_key("collector", {"group": "fermilab"})
+        schedd_cache.store(key, [make_ad("s1.example.com")])
+        assert schedd_cache.lookup(key) == (None, False)
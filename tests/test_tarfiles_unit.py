@@ -68,6 +68,126 @@ class TestTarfilesUnit:
         os.unlink(t2)
         assert h1 == h2
 
+    @pytest.mark.unit
+    def test_parallel_gzip_1(self):
+        """parallel gzip output is gzip, and the same for any thread count"""
+        import gzip
+        import io
+
+        data = os.urandom(100000) + b"jobsub" * 50000
+        outs = []
+        for workers in (1, 3):
+            buf = io.BytesIO()
+            w = tarfiles.ParallelGzipWriter(buf, block_size=65536, workers=workers)
+            w.write(data[:12345])
+            w.write(data[12345:])
+            w.close()
+            outs.append(buf.getvalue())
+        assert outs[0] == outs[1]
+        assert gzip.decompress(outs[0]) == data
+
+    @pytest.mark.unit
+    def test_write_tarball_1(self, tmp_path, monkeypatch):
+        """tarballs honour excludes, and their digest is cached"""
+        import tarfile
+        import digest_cache
+
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        monkeypatch.setattr(digest_cache, "DIGEST_CACHE", True)
+        src = tmp_path / "src"
+        (src / "sub").mkdir(parents=True)
+        (src / "sub" / "keep.txt").write_text("keep")
+        (src / "sub" / "skip.log").write_text("skip")
+        (src / "run.sh").write_text("echo hi")
+        tarball = str(tmp_path / "src.tar.gz")
+        digest = tarfiles.write_tarball(
+            tarball, str(src), tarfiles.exclude_matcher(["*.log"])
+        )
+        with tarfile.open(tarball) as tf:
+            assert tf.getnames() == [".", "./run.sh", "./sub", "./sub/keep.txt"]
+            assert tf.extractfile("./sub/keep.txt").read() == b"keep"
+        assert digest == tarfiles.hash_file(tarball)
+        assert digest_cache.lookup(digest_cache.file_key(tarball)) == digest
+
+        tarfiles.write_tarball(
+            tarball, str(src), tarfiles.exclude_matcher([]), top="run.sh"
+        )
+        with tarfile.open(tarball) as tf:
+            assert tf.getnames() == ["run.sh"]
+
+    @pytest.mark.unit
+    def test_write_tarball_error_1(self, tmp_path, monkeypatch):
+        """a failed tarball is cleaned up, compression threads and all"""
+        import tarfile
+
+        src = tmp_path / "src"
+        src.mkdir()
+        for i in range(3):
+            (src / f"f{i}").write_bytes(os.urandom(4096))
+        pools = []
+        real_init = tarfiles.ParallelGzipWriter.__init__
+        real_addfile = tarfile.TarFile.addfile
+
+        def init(self, *args, **kwargs):
+            real_init(self, *args, **kwargs)
+            pools.append(self.pool)
+
+        def broken(self, ti, fileobj=None):
+            if ti.name.endswith("f1"):
+                raise OSError("disk on fire")
+            return real_addfile(self, ti, fileobj)
+
+        monkeypatch.setattr(tarfiles.ParallelGzipWriter, "__init__", init)
+        monkeypatch.setattr(tarfile.TarFile, "addfile", broken)
+        tarball = tmp_path / "src.tar.gz"
+        with pytest.raises(OSError, match="disk on fire"):
+            tarfiles.write_tarball(str(tarball), str(src), tarfiles.exclude_matcher([]))
+        assert not tarball.exists()
+        assert pools and pools[0]._shutdown
+
+    @pytest.mark.unit
+    def test_canonical_tar_1(self, tmp_path):
+        """the same files make the same canonical tarball, whatever their
+        times, permissions and the order they were made in"""
+        import tarfile
+
+        trees = []
+        for i, names in enumerate([["a", "b/c.sh"], ["b/c.sh", "a"]]):
+            src = tmp_path / f"src{i}"
+            for name in names:
+                f = src / name
+                f.parent.mkdir(parents=True, exist_ok=True)
+                f.write_text(name)
+                f.chmod(0o700 if name.endswith(".sh") else 0o600 + 0o44 * i)
+                os.utime(f, (1000000 + i, 1000000 + i))
+            trees.append(src)
+        # a hard link in one tree, a copy in the other
+        os.link(trees[0] / "a", trees[0] / "d")
+        (trees[1] / "d").write_text("a")
+        digests = [
+            tarfiles.write_tarball(
+                str(tmp_path / f"t{i}.tar.gz"),
+                str(src),
+                tarfiles.exclude_matcher([]),
+                canonical=canonical,
+            )
+            for canonical in (False, True)
+            for i, src in enumerate(trees)
+        ]
+        assert digests[0] != digests[1]
+        assert digests[2] == digests[3]
+        with tarfile.open(tmp_path / "t1.tar.gz") as tf:
+            ti = tf.getmember("./b/c.sh")
+            assert (ti.mode, ti.mtime, ti.uid) == (
+                0o755,
+                tarfiles.CANONICAL_MTIME,
+                0,
+            )
+            assert tf.getmember("./a").mode == 0o644
+        with tarfile.open(tmp_path / "t0.tar.gz") as tf:
+            assert tf.getmember("./d").isreg()
+            assert tf.extractfile("./d").read() == b"a"
+
     @pytest.mark.unit
     def test_dcache_persistent_path_1(self):
         """make sure persistent path gives /pnfs/ path digest"""
@@ -102,6 +222,102 @@ class TestTarfilesUnit:
 
         assert location is not None
 
+    @pytest.mark.unit
+    def test_publish_stream_1(self, tmp_path):
+        """publish from a file streams it, hashing what it sends"""
+        import hashlib
+        import http.server
+        import threading
+
+        got = {}
+
+        class StandIn(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                got["length"] = self.headers.get("Content-Length")
+                got["body"] = self.rfile.read(int(got["length"]))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        data = os.urandom(3 * tarfiles.CHUNK_SIZE + 17)
+        tarball = tmp_path / "x.tar.gz"
+        tarball.write_bytes(data)
+        digest = tarfiles.hash_file(str(tarball))
+        assert digest == hashlib.sha256(data).hexdigest()
+        assert digest == tarfiles.slurp_file(str(tarball))[0]
+
+        publisher = tarfiles.TarfilePublisherHandler(f"test/{digest}")
+        publisher.dropbox_servers = (f"127.0.0.1:{server.server_address[1]}",)
+        publisher.pubapi_base_url_formatter_full = (
+            publisher.pubapi_base_url_formatter_full.replace("https:", "http:")
+        )
+        publisher.publish(str(tarball))
+        server.shutdown()
+        assert got["length"] == str(len(data))
+        assert got["body"] == data
+        assert publisher.sent_digest == digest
+
+    @pytest.mark.unit
+    def test_tree_manifest_1(self, tmp_path):
+        """manifests change with the tree, but not with excluded files"""
+        # the excludes file sits beside the tree, not in it
+        tree = tmp_path / "tree"
+        (tree / "sub").mkdir(parents=True)
+        (tree / "sub" / "a.txt").write_text("a")
+        (tree / "b.log").write_text("b")
+        excludes = tmp_path / "excludes"
+        excludes.write_text("*.log\n")
+        m1 = tarfiles.tree_manifest(str(tree), str(excludes))
+        assert tarfiles.tree_manifest(str(tree), str(excludes)) == m1
+        (tree / "b.log").write_text("bb")
+        assert tarfiles.tree_manifest(str(tree), str(excludes)) == m1
+        (tree / "sub" / "a.txt").write_text("aa")
+        assert tarfiles.tree_manifest(str(tree), str(excludes)) != m1
+
+        excluded = tarfiles.exclude_matcher(["*.log", ".git", "\\.core$"])
+        assert excluded("./b.log") and excluded("./sub/x.log")
+        assert excluded("./sub/.git") and not excluded("./sub/.gitignore")
+        assert excluded("./x.core$") is False and excluded("./.core$")
+
+    @pytest.mark.unit
+    def test_do_tarballs_tardir_cache_1(self, tmp_path, cache_home, monkeypatch):
+        """an unchanged tardir: already in the dropbox isn't tarred again"""
+        import tardir_cache
+
+        monkeypatch.setattr(tardir_cache, "TARDIR_CACHE", True)
+        tdir = tmp_path / "code"
+        tdir.mkdir()
+        (tdir / "run.sh").write_text("echo hi\n")
+        manifest = tarfiles.tree_manifest(str(tdir), None)
+        tardir_cache.store(
+            manifest, "fermilab", "pnfs", "abc", "/pnfs/fermilab/x/code.tar.gz"
+        )
+
+        def no_tar(*args):
+            raise AssertionError("should not tar up an unchanged directory")
+
+        monkeypatch.setattr(tarfiles, "tar_up", no_tar)
+        monkeypatch.setattr(tarfiles.fake_ifdh, "ls", lambda p: [p])
+        args = get_parser.get_parser().parse_args(
+            [
+                "--tar_file_name",
+                f"tardir:{tdir}",
+                "--use-pnfs-dropbox",
+                "--group",
+                "fermilab",
+                "file:///bin/true",
+            ]
+        )
+        tarfiles.do_tarballs(args)
+        assert args.tar_file_name == ["/pnfs/fermilab/x/code.tar.gz"]
+        assert args.tar_file_orig_basenames == ["code"]
+
     @pytest.mark.unit
     def test_do_tarballs_1(self, needs_credentials):
         """test that the do_tarballs method does a dropbox:path
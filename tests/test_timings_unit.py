@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+#
+# we assume everwhere our current directory is in the package
+# test area, so go ahead and cd there
+#
+os.chdir(os.path.dirname(__file__))
+
+
+#
+# import modules we need to test, since we chdir()ed, can use relative path
+# unless we're testing installed, then use /opt/jobsub_lite/...
+#
+if os.environ.get("JOBSUB_TEST_INSTALLED", "0") == "1":
+    sys.path.append("/opt/jobsub_lite/lib")
+else:
+    sys.path.append("../lib")
+
+import timings
+
+
+class TestTimingsUnit:
+    """
+    Use with pytest... unit tests for ../lib/*.py
+    """
+
+    # lib/timings.py routines...
+
+    @pytest.mark.unit
+    def test_phases_1(self, tmp_path):
+        """phases add up calls, wall and subprocess time, in order"""
+        timings.reset()
+
+        @timings.timed("sleepy")
+        def sleepy():
+            time.sleep(0.01)
+
+        sleepy()
+        sleepy()
+        with timings.phase("busy child"):
+            subprocess.run([sys.executable, "-c", "sum(range(3000000))"], check=True)
+        t = timings.get_timings()
+        assert list(t["phases"]) == ["sleepy", "busy child"]
+        assert t["phases"]["sleepy"]["calls"] == 2
+        assert t["phases"]["sleepy"]["wall"] >= 0.02
+        assert t["phases"]["busy child"]["subprocess"] > 0
+        assert t["total"] >= t["phases"]["sleepy"]["wall"]
+
+        lines = timings.report()
+        assert lines[0].split() == ["PHASE", "CALLS", "WALL", "SUBPROC", "%"]
+        assert lines[1].split()[:2] == ["sleepy", "2"]
+        assert lines[-1].split()[0] == "total"
+
+        out = tmp_path / "timings.json"
+        timings.write_json(str(out))
+        assert json.loads(out.read_text())["phases"]["sleepy"]["calls"] == 2
@@ -84,6 +84,37 @@ class TestUtilsUnit:
         utils.fix_unit(args, "memory", memtable, -1, "b", -2)
         assert args["memory"] == 64 * 1024
 
+    @pytest.mark.unit
+    def test_get_queue_items_1(self, tmp_path):
+        """--queue-from lines times --arg-matrix values"""
+        qf = tmp_path / "points.txt"
+        qf.write_text("# parameter points\nenergy, angle\n1.5, 10\n2.5 20\n")
+        qvars, items = utils.get_queue_items(str(qf), ["seed=1,2"])
+        assert qvars == ["energy", "angle", "seed"]
+        assert items == ["1.5,10,1", "1.5,10,2", "2.5,20,1", "2.5,20,2"]
+        # the last variable gets the rest of the line, like condor does
+        qf.write_text("energy label\n1.5 low energy\n")
+        assert utils.get_queue_items(str(qf), []) == (
+            ["energy", "label"],
+            ["1.5,low energy"],
+        )
+        assert utils.get_queue_items(None, []) == ([], [])
+        for bad in (["Process=1,2"], ["x=1;2"], ["x=1", "x=2"], ["x"]):
+            with pytest.raises(SystemExit):
+                utils.get_queue_items(None, bad)
+
+    @pytest.mark.unit
+    def test_cache_db_1(self, cache_home):
+        """cache databases get their tables, and trim_lru keeps the newest"""
+        schema = "CREATE TABLE IF NOT EXISTS t (k TEXT, used REAL);"
+        with utils.cache_db("t.sqlite", schema) as conn:
+            rows = [("a", 1), ("b", 3), ("c", 2)]
+            conn.executemany("INSERT INTO t VALUES (?, ?)", rows)
+            utils.trim_lru(conn, "t", 2)
+        assert os.path.exists(cache_home / "jobsub_lite" / "t.sqlite")
+        with utils.cache_db("t.sqlite", schema) as conn:
+            assert sorted(k for (k,) in conn.execute("SELECT k FROM t")) == ["b", "c"]
+
     @pytest.mark.unit
     def test_get_principal_1(self):
         """make sure get_principal returns a string starting with $USER"""